@@ -212,9 +212,11 @@ class HybridComparator:
         total_pixels = visual_result['total_pixels']
         has_visual_differences = different_pixels > 0
         
-        # Stwórz highlighted diff
-        highlighted_path = f"highlighted_diffs/page_{page_num}_diff.png"
-        self.visual_comparator.create_highlighted_diff(img1_path, img2_path, highlighted_path)
+        # Stwórz highlighted diff (tylko dla stron z różnicami)
+        highlighted_path = None
+        if has_visual_differences:
+            highlighted_path = f"highlighted_diffs/page_{page_num}_diff.png"
+            self.visual_comparator.create_highlighted_diff(img1_path, img2_path, highlighted_path)
         
         # Kombinacja wyników (60% vision, 40% OCR)
         overall_similarity = (visual_similarity * 0.6) + (text_similarity * 0.4)
@@ -359,7 +361,7 @@ def display_results(results):
             
             with col2:
                 # Pokaż highlighted obraz jeśli istnieje
-                if os.path.exists(result.highlighted_diff_path):
+                if result.highlighted_diff_path and os.path.exists(result.highlighted_diff_path):
                     st.write("**Różnice wizualne:**")
                     image = Image.open(result.highlighted_diff_path)
                     st.image(image, caption="Czerwone = różnice", use_column_width=True)
@@ -0,0 +1,67 @@
+import os
+import shutil
+import sys
+import time
+
+import pdf2image
+
+from pdf_processor import PDFProcessor
+
+BENCH_FOLDER = "temp_benchmark"
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+def _reset_folder(folder):
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder, exist_ok=True)
+
+def _render_sequential(pdf_paths, dpi):
+    """
+    Dotychczasowa ścieżka: jeden proces poppler, dokumenty po kolei, PPM → PIL → PNG
+    """
+    for doc_index, pdf_path in enumerate(pdf_paths):
+        output_folder = os.path.join(BENCH_FOLDER, f"seq_{doc_index}")
+        os.makedirs(output_folder, exist_ok=True)
+        images = pdf2image.convert_from_path(pdf_path, dpi=dpi, fmt='PNG')
+        for i, image in enumerate(images):
+            image.save(os.path.join(output_folder, f"page_{i+1}.png"), 'PNG')
+
+def bench_rendering(pdf_paths, dpi=200):
+    """
+    Porównuje renderowanie sekwencyjne z równoległym (wszystkie backendy)
+    """
+    print("\n⏱️ RENDEROWANIE PDF")
+    print("-" * 40)
+    _reset_folder(BENCH_FOLDER)
+
+    baseline, _ = _timed(_render_sequential, pdf_paths, dpi)
+    print(f"Sekwencyjnie (convert_from_path): {baseline:.2f}s")
+
+    for backend in ['auto', 'pdftoppm-ppm', 'pdftoppm-png', 'pdftocairo-png']:
+        _reset_folder(BENCH_FOLDER)
+        processor = PDFProcessor(dpi=dpi, backend=backend)
+        documents = [
+            (pdf_path, os.path.join(BENCH_FOLDER, f"par_{doc_index}"))
+            for doc_index, pdf_path in enumerate(pdf_paths)
+        ]
+        elapsed, _ = _timed(processor.render_documents, documents)
+        print(f"Równolegle [{backend}, {processor.workers} workerów]: "
+              f"{elapsed:.2f}s (przyspieszenie x{baseline / elapsed:.2f})")
+
+    shutil.rmtree(BENCH_FOLDER, ignore_errors=True)
+
+BENCHMARKS = [
+    bench_rendering,
+]
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Użycie: python benchmark.py <pdf1> <pdf2>")
+        sys.exit(1)
+
+    pdf_paths = sys.argv[1:3]
+    for benchmark in BENCHMARKS:
+        benchmark(pdf_paths)
@@ -10,9 +10,12 @@ if not os.path.exists('/usr/bin/tesseract'):
 import streamlit as st
 from hybrid_report_generator import HybridReportGenerator
 import os
-from PIL import Image
-import zipfile
-import io
+from job_export import write_job_archive
+from ignore_regions import IgnoreTemplate
+from page_budget import degradation_labels
+from comparison_service import ServiceClient
+from hybrid_comparator import result_severity, SEVERITY_CRITICAL, SEVERITY_MODERATE, SEVERITY_MINOR
+import json
 
 # Konfiguracja strony
 st.set_page_config(
@@ -46,6 +49,27 @@ st.sidebar.markdown("""
 - 📊 Metryki podobieństwa
 """)
 
+# Szablon obszarów ignorowanych (znaczniki czasu, numery zleceń, stopki...)
+ignore_file = st.sidebar.file_uploader("🚫 Szablon obszarów ignorowanych (JSON)", type="json")
+if ignore_file:
+    st.session_state["ignore_template"] = IgnoreTemplate.from_dict(json.load(ignore_file))
+    st.sidebar.caption(f"Obszary ignorowane: {len(st.session_state['ignore_template'].regions)}")
+else:
+    # Plik usunięty z pola - szablon przestaje obowiązywać
+    st.session_state.pop("ignore_template", None)
+
+# Diff tekstu całego dokumentu - tekst przelany na sąsiednią stronę nie jest zmianą
+document_text = st.sidebar.checkbox("📜 Porównuj tekst całego dokumentu (przelewanie tekstu)")
+
+# SSIM zamiast progu pikseli - antyaliasing i szum renderowania nie obniżają wyniku
+structural_metric = st.sidebar.checkbox("🧱 Podobieństwo strukturalne (SSIM)")
+VISUAL_METRIC = 'ssim' if structural_metric else 'threshold'
+
+# Usługa porównań (comparison_service.py) - aplikacja jest wtedy tylko cienkim klientem
+SERVICE_URL = os.environ.get("PDF_COMPARISON_SERVICE")
+if SERVICE_URL:
+    st.sidebar.caption(f"🌐 Usługa porównań: {SERVICE_URL}")
+
 # Główna aplikacja
 def main():
     st.header("📤 Wgraj pliki PDF do porównania")
@@ -72,6 +96,10 @@ def main():
         # Przycisk analizy
         if st.button("🚀 Rozpocznij analizę", type="primary"):
             analyze_pdfs()
+    
+    # Wyniki przetrwają kolejne przebiegi skryptu (np. kliknięcie "pełna rozdzielczość")
+    if "analysis" in st.session_state:
+        display_results(*st.session_state["analysis"])
 
 def analyze_pdfs():
     """Główna funkcja analizy"""
@@ -81,11 +109,19 @@ def analyze_pdfs():
     status_text = st.empty()
     
     try:
+        if SERVICE_URL:
+            analyze_with_service(progress_bar, status_text)
+            return
+        
         # Inicjalizacja
         status_text.text("🔧 Inicjalizacja systemu...")
         progress_bar.progress(10)
         
-        generator = HybridReportGenerator()
+        generator = HybridReportGenerator(
+            ignore_template=st.session_state.get("ignore_template"),
+            text_mode='document' if document_text else 'page',
+            visual_metric=VISUAL_METRIC
+        )
         
         # Analiza
         status_text.text("🔍 Analiza hybrydowa w toku...")
@@ -96,17 +132,64 @@ def analyze_pdfs():
         progress_bar.progress(100)
         status_text.text("✅ Analiza zakończona!")
         
-        # Wyświetl wyniki
-        display_results(report_file, results)
+        # Zapamiętaj wyniki - wyświetla je main()
+        st.session_state["generator"] = generator
+        st.session_state.pop("service_job", None)
+        st.session_state["analysis"] = (report_file, results, generator.comparator.last_alignment)
         
     except Exception as e:
         st.error(f"❌ Błąd podczas analizy: {e}")
 
-def display_results(report_file, results):
+def analyze_with_service(progress_bar, status_text):
+    """Analiza w usłudze porównań - wyniki stron pokazywane na bieżąco"""
+    client = ServiceClient(SERVICE_URL)
+    
+    status_text.text("📤 Przesyłam pliki do usługi...")
+    progress_bar.progress(10)
+    job_id = client.compare(
+        "temp_pdf1.pdf", "temp_pdf2.pdf",
+        text_mode='document' if document_text else 'page',
+        visual_metric=VISUAL_METRIC,
+        ignore_template=st.session_state.get("ignore_template")
+    )
+    
+    results = []
+    progress_bar.progress(30)
+    for result in client.iter_results(job_id):
+        results.append(result)
+        status_text.text(f"🔍 Przeanalizowane strony: {len(results)}")
+    
+    report_file = client.download(job_id, 'report', os.path.join("exports", f"hybrid_report_{job_id}.txt"),
+                                  fmt='txt')
+    progress_bar.progress(100)
+    status_text.text("✅ Analiza zakończona!")
+    
+    st.session_state["service_job"] = job_id
+    st.session_state["analysis"] = (report_file, results, client.alignment(job_id))
+
+def display_results(report_file, results, alignment=None):
     """Wyświetla wyniki analizy"""
     
     st.header("📊 Wyniki analizy")
     
+    # Strony bez odpowiednika w drugim dokumencie
+    alignment = alignment or []
+    inserted_pages = [m.page2 for m in alignment if m.status == 'inserted']
+    deleted_pages = [m.page1 for m in alignment if m.status == 'deleted']
+    if inserted_pages:
+        st.warning(f"➕ Strony dodane w drugim PDF: {inserted_pages}")
+    if deleted_pages:
+        st.warning(f"➖ Strony usunięte z pierwszego PDF: {deleted_pages}")
+    
+    if not results:
+        st.info("ℹ️ Brak par stron do porównania")
+        return
+    
+    # Strony porównane w trybie uproszczonym (przekroczone limity czasu / pikseli)
+    degraded_pages = [r.page_number for r in results if r.degraded]
+    if degraded_pages:
+        st.warning(f"⏱️ Strony w trybie uproszczonym ({len(degraded_pages)}): {degraded_pages}")
+    
     # Podsumowanie
     pages_with_differences = sum(1 for r in results if r.overall_similarity < 1.0)
     avg_similarity = sum(r.overall_similarity for r in results) / len(results)
@@ -127,32 +210,58 @@ def display_results(report_file, results):
     st.subheader("📋 Szczegóły stron")
     
     for result in results:
-        with st.expander(f"📄 Strona {result.page_number} - Podobieństwo: {result.overall_similarity:.1%}"):
+        page_label = f"{result.page_number}"
+        if result.page_number_pdf2 not in (None, result.page_number):
+            page_label += f" ↔ {result.page_number_pdf2}"
+        
+        with st.expander(f"📄 Strona {page_label} - Podobieństwo: {result.overall_similarity:.1%}"):
             
             col1, col2 = st.columns(2)
             
             with col1:
                 st.write("**Metryki:**")
                 st.write(f"👁️ Wizualne: {result.visual_similarity_score:.1%}")
-                st.write(f"📝 Tekstowe: {result.text_similarity_score:.1%}")
+                if result.text_similarity_score is None:
+                    st.write("📝 Tekstowe: pominięte (limit czasu OCR)")
+                else:
+                    st.write(f"📝 Tekstowe: {result.text_similarity_score:.1%}")
+                if result.structural_similarity_score is not None:
+                    st.write(f"🧱 Strukturalne (SSIM): {result.structural_similarity_score:.1%}")
                 st.write(f"🎯 Ogólne: {result.overall_similarity:.1%}")
                 
-                # Klasyfikacja
-                if result.overall_similarity < 0.5:
+                # Klasyfikacja (lokalna zmiana struktury w mapie SSIM podnosi klasę)
+                severity = result_severity(result)
+                if severity == SEVERITY_CRITICAL:
                     st.error("🔴 Różnice krytyczne")
-                elif result.overall_similarity < 0.9:
+                elif severity == SEVERITY_MODERATE:
                     st.warning("🟡 Różnice średnie")
-                elif result.overall_similarity < 1.0:
+                elif severity == SEVERITY_MINOR:
                     st.info("🟢 Różnice drobne")
                 else:
                     st.success("✅ Identyczne")
+                
+                if result.degraded:
+                    st.caption(f"⏱️ Tryb uproszczony: {degradation_labels(result.degradation)}")
             
             with col2:
-                # Pokaż highlighted obraz jeśli istnieje
-                if os.path.exists(result.highlighted_diff_path):
+                # Miniatura różnic; pełny obraz generowany dopiero na żądanie
+                service_job = st.session_state.get("service_job")
+                if result.thumbnail_path and (service_job or os.path.exists(result.thumbnail_path)):
                     st.write("**Różnice wizualne:**")
-                    image = Image.open(result.highlighted_diff_path)
-                    st.image(image, caption="Czerwone = różnice", use_column_width=True)
+                    if service_job:
+                        client = ServiceClient(SERVICE_URL)
+                        thumbnail = client.page_image(service_job, result.page_number, 'thumbnail')
+                    else:
+                        thumbnail = result.thumbnail_path
+                    st.image(thumbnail, caption="Czerwone = różnice", use_column_width=True)
+                    
+                    if st.button("🔍 Pełna rozdzielczość", key=f"full_{result.page_number}"):
+                        if service_job:
+                            full_image = client.page_image(service_job, result.page_number, 'diff')
+                        else:
+                            comparator = st.session_state["generator"].comparator
+                            full_image = comparator.get_highlighted_diff(result)
+                        st.image(full_image, caption="Czerwone = różnice (pełna rozdzielczość)")
     
     # Download raportu
     st.subheader("📥 Pobierz wyniki")
@@ -173,30 +282,33 @@ def display_results(report_file, results):
             )
     
     with col2:
-        # Zip z obrazami
-        if os.path.exists("highlighted_diffs"):
-            zip_buffer = create_images_zip()
-            st.download_button(
-                label="🖼️ Pobierz obrazy (ZIP)",
-                data=zip_buffer,
-                file_name="highlighted_differences.zip",
-                mime="application/zip"
-            )
-
-def create_images_zip():
-    """Tworzy ZIP z highlighted obrazami"""
-    zip_buffer = io.BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w') as zip_file:
-        for filename in os.listdir("highlighted_diffs"):
-            if filename.endswith('.png'):
-                zip_file.write(
-                    os.path.join("highlighted_diffs", filename),
-                    filename
+        # ZIP tylko z artefaktami tego zadania (raporty, podglądy, summary.json).
+        # Budowany raz na zadanie i dopiero na żądanie - każde kliknięcie w Streamlit to ponowne
+        # wykonanie skryptu, a download_button i tak przekazuje cały plik przez pamięć
+        job_key = st.session_state.get("service_job") or report_file
+        archives = st.session_state.setdefault("job_archives", {})
+        archive_path = archives.get(job_key)
+        if not (archive_path and os.path.exists(archive_path)):
+            archive_path = None
+            if st.button("📦 Przygotuj wyniki (ZIP)"):
+                archive_path = archives[job_key] = create_job_zip(report_file, results)
+        if archive_path:
+            with open(archive_path, 'rb') as archive:
+                st.download_button(
+                    label="🖼️ Pobierz wyniki (ZIP)",
+                    data=archive.read(),
+                    file_name=os.path.basename(archive_path),
+                    mime="application/zip"
                 )
-    
-    zip_buffer.seek(0)
-    return zip_buffer.getvalue()
+
+def create_job_zip(report_file, results):
+    """Zapisuje ZIP zadania na dysk (pliki dopisywane kolejno, bez rekompresji)"""
+    service_job = st.session_state.get("service_job")
+    if service_job:
+        archive_path = os.path.join("exports", f"job_{service_job}.zip")
+        return ServiceClient(SERVICE_URL).download(service_job, 'archive', archive_path)
+    archive_path = os.path.join("exports", os.path.splitext(os.path.basename(report_file))[0] + ".zip")
+    return write_job_archive(archive_path, results, report_file)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
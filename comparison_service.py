@@ -0,0 +1,761 @@
+from hybrid_comparator import HybridComparator, result_severity, result_to_dict, result_from_dict
+from hybrid_report_generator import HybridReportGenerator
+from results_store import ResultsStore
+from pdf_processor import PDFProcessor
+from text_extractor import TextExtractor
+from page_budget import PageBudget
+from ignore_regions import IgnoreTemplate
+from job_export import iter_job_archive, job_report_files
+from page_aligner import PageMatch
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from dataclasses import asdict
+from email.message import Message
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+CHUNK_SIZE = 1024 * 1024
+
+# Stany zadania
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+class QueueFullError(Exception):
+    """Kolejka usługi pełna - klient powinien ponowić po retry_after sekundach"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Kolejka pełna, spróbuj ponownie za {retry_after} s")
+        self.retry_after = retry_after
+
+class ComparisonJob:
+    """
+    Zadanie porównania w usłudze. Wyniki stron dopisywane są na bieżąco -
+    klienci mogą je strumieniować, zanim zadanie się skończy.
+    """
+
+    def __init__(self, job_id, pdf1_path, pdf2_path, work_dir, text_mode='page',
+                 ignore_template=None, use_cache=True, visual_metric='threshold'):
+        self.job_id = job_id
+        self.pdf1_path = pdf1_path
+        self.pdf2_path = pdf2_path
+        self.work_dir = work_dir
+        self.text_mode = text_mode
+        self.ignore_template = ignore_template
+        self.use_cache = use_cache
+        self.visual_metric = visual_metric
+
+        self.status = JOB_QUEUED
+        self.results = []
+        self.alignment = []
+        self.report_file = None
+        self.error = None
+        self.comparator = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in (JOB_DONE, JOB_FAILED)
+
+    def start(self):
+        with self._changed:
+            self.status = JOB_RUNNING
+            self.started_at = time.time()
+            self._changed.notify_all()
+
+    def add_result(self, result):
+        with self._changed:
+            self.results.append(result)
+            self._changed.notify_all()
+
+    def finish(self, status, error=None):
+        with self._changed:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    def iter_results(self, poll_interval=1.0):
+        """
+        Wyniki stron w kolejności - także te, które dopiero powstaną (blokuje do końca zadania)
+        """
+        index = 0
+        while True:
+            with self._changed:
+                while index >= len(self.results) and not self.finished:
+                    self._changed.wait(poll_interval)
+                batch = self.results[index:]
+                finished = self.finished
+            yield from batch
+            index += len(batch)
+            if finished and index >= len(self.results):
+                return
+
+    def find_result(self, page_number):
+        for result in self.results:
+            if result.page_number == page_number:
+                return result
+        return None
+
+    def to_dict(self):
+        results = list(self.results)
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'text_mode': self.text_mode,
+            'visual_metric': self.visual_metric,
+            'pages_done': len(results),
+            'pages_with_differences': sum(1 for r in results if r.overall_similarity < 1.0),
+            'degraded_pages': [r.page_number for r in results if r.degraded],
+            'alignment': [asdict(match) for match in self.alignment],
+            'report_file': os.path.basename(self.report_file) if self.report_file else None,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+class ComparisonService:
+    """
+    Porównania PDF jako usługa: rozgrzane pule renderowania i OCR, wspólny magazyn wyników
+    i szablony ignorowania (z buforowanymi maskami) współdzielone przez wszystkie zadania.
+    """
+
+    def __init__(self, work_root="service_jobs", job_workers=2, max_queue=8, max_finished_jobs=50,
+                 results_store: ResultsStore = None, budget: PageBudget = None,
+                 formats=('txt', 'jsonl')):
+        """
+        job_workers - zadania wykonywane równocześnie
+        max_queue - limit zadań oczekujących + wykonywanych; powyżej usługa odpowiada 503
+        max_finished_jobs - ile zakończonych zadań (z plikami) trzymać do pobrania
+        """
+        self.work_root = os.path.abspath(work_root)
+        self.upload_dir = os.path.join(self.work_root, "uploads")
+        os.makedirs(self.upload_dir, exist_ok=True)
+
+        self.budget = budget if budget is not None else PageBudget()
+        self.processor = PDFProcessor(dpi=200, budget=self.budget)
+        self.extractor = TextExtractor(timeout=self.budget.ocr_seconds or 0,
+                                       workers=os.cpu_count() or 1)
+        self.results_store = results_store if results_store is not None else ResultsStore(
+            os.path.join(self.work_root, "comparison_results.db")
+        )
+        self.formats = formats
+        self.job_workers = job_workers
+        self.max_queue = max_queue
+        self.max_finished_jobs = max_finished_jobs
+
+        self._jobs = {}
+        self._finished = deque()
+        self._templates = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=job_workers, thread_name_prefix="job")
+        self._avg_job_seconds = 30.0
+
+    # === PRZESYŁANIE PLIKÓW ===
+
+    def store_upload(self, chunks) -> str:
+        """
+        Zapisuje przesyłany PDF kawałkami (bez bufora w pamięci); identyfikator = SHA-256 treści
+        """
+        temp_path = os.path.join(self.upload_dir, f"upload_{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        header = b""
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in chunks:
+                    if len(header) < 5:
+                        header += chunk[:5]
+                    digest.update(chunk)
+                    f.write(chunk)
+            if not header.startswith(b"%PDF"):
+                raise ValueError("Przesłany plik nie jest PDF-em")
+
+            upload_id = digest.hexdigest()
+            upload_path = os.path.join(self.upload_dir, f"{upload_id}.pdf")
+            if os.path.exists(upload_path):
+                os.remove(temp_path)  # ten sam plik już jest - bez duplikatu
+            else:
+                os.replace(temp_path, upload_path)
+            return upload_id
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def upload_path(self, upload_id: str) -> str:
+        if not re.fullmatch(r"[0-9a-f]{64}", upload_id or ""):
+            raise KeyError(f"Nieprawidłowy identyfikator pliku: {upload_id}")
+        path = os.path.join(self.upload_dir, f"{upload_id}.pdf")
+        if not os.path.exists(path):
+            raise KeyError(f"Nie znaleziono pliku: {upload_id}")
+        return path
+
+    # === ZADANIA ===
+
+    def queue_depth(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def _retry_after(self, depth):
+        return max(1, round(self._avg_job_seconds * (depth - self.job_workers + 1) / self.job_workers))
+
+    def _template(self, data):
+        """
+        Szablony z tą samą treścią są współdzielone - maski kompilowane raz dla wszystkich zadań
+        """
+        if not data:
+            return None
+        template = IgnoreTemplate.from_dict(data)
+        with self._lock:
+            return self._templates.setdefault(template.key(), template)
+
+    def submit(self, pdf1_path, pdf2_path, text_mode='page', ignore_template=None,
+               use_cache=True, visual_metric='threshold') -> ComparisonJob:
+        """
+        Dodaje zadanie do kolejki; QueueFullError, gdy przekroczony limit max_queue
+        """
+        if text_mode not in HybridComparator.TEXT_MODES:
+            raise ValueError(f"Nieznany tryb tekstu: {text_mode}")
+        if visual_metric not in HybridComparator.VISUAL_METRICS:
+            raise ValueError(f"Nieznana miara wizualna: {visual_metric}")
+        if isinstance(ignore_template, dict):
+            ignore_template = self._template(ignore_template)
+
+        with self._lock:
+            depth = sum(1 for job in self._jobs.values() if not job.finished)
+            if depth >= self.max_queue:
+                raise QueueFullError(self._retry_after(depth))
+
+            job_id = uuid.uuid4().hex
+            work_dir = os.path.join(self.work_root, job_id)
+            os.makedirs(work_dir, exist_ok=True)
+            job = ComparisonJob(job_id, pdf1_path, pdf2_path, work_dir, text_mode,
+                                ignore_template, use_cache, visual_metric)
+            self._jobs[job_id] = job
+
+        print(f"📥 Zadanie {job_id} w kolejce (oczekujące: {depth + 1})")
+        self._executor.submit(self._run_job, job)
+        return job
+
+    def get_job(self, job_id) -> ComparisonJob:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Nie znaleziono zadania: {job_id}")
+        return job
+
+    def _run_job(self, job: ComparisonJob):
+        job.start()
+        print(f"🚀 Zadanie {job.job_id} rozpoczęte")
+        try:
+            job.comparator = HybridComparator(
+                ignore_template=job.ignore_template,
+                text_mode=job.text_mode,
+                visual_metric=job.visual_metric,
+                budget=self.budget,
+                processor=self.processor,
+                extractor=self.extractor,
+                work_dir=job.work_dir
+            )
+            generator = HybridReportGenerator(self.results_store, self.formats, comparator=job.comparator)
+            report_file, _ = generator.generate_hybrid_report(
+                job.pdf1_path, job.pdf2_path,
+                output_file=os.path.join(job.work_dir, f"report.{self.formats[0]}"),
+                use_cache=job.use_cache,
+                on_result=job.add_result
+            )
+            job.alignment = job.comparator.last_alignment
+            job.report_file = report_file
+            job.finish(JOB_DONE)
+            print(f"✅ Zadanie {job.job_id} zakończone ({len(job.results)} stron)")
+        except Exception as e:
+            job.finish(JOB_FAILED, str(e))
+            print(f"❌ Zadanie {job.job_id} nieudane: {e}")
+        finally:
+            self._release_job_pages(job)
+            # Średnia krocząca czasu zadania - do nagłówka Retry-After
+            duration = time.time() - job.started_at
+            self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * duration
+            self._retire(job)
+
+    def _release_job_pages(self, job):
+        """
+        Metadane stron zadania nie są już potrzebne - wspólne komponenty nie rosną bez końca
+        """
+        prefix = job.work_dir + os.sep
+        self.processor.release_pages(
+            [path for path in list(self.processor.degraded_pages) + list(self.processor.tiled_pages)
+             if path.startswith(prefix)]
+        )
+        self.extractor.timed_out -= {path for path in list(self.extractor.timed_out)
+                                     if path.startswith(prefix)}
+
+    def _retire(self, job):
+        """
+        Najstarsze zakończone zadania (i ich pliki) są usuwane powyżej max_finished_jobs
+        """
+        with self._lock:
+            self._finished.append(job.job_id)
+            evicted = []
+            while len(self._finished) > self.max_finished_jobs:
+                evicted.append(self._jobs.pop(self._finished.popleft()))
+        for old_job in evicted:
+            shutil.rmtree(old_job.work_dir, ignore_errors=True)
+
+    def highlighted_diff(self, job: ComparisonJob, page_number: int) -> str:
+        """
+        Pełnowymiarowy obraz różnic strony - generowany przy pierwszym żądaniu
+        """
+        result = job.find_result(page_number)
+        if result is None or job.comparator is None:
+            return None
+        if result.source_image_path and not os.path.exists(result.source_image_path) \
+                and not (result.highlighted_diff_path and os.path.exists(result.highlighted_diff_path)):
+            return None  # raster strony już usunięty
+        return job.comparator.get_highlighted_diff(result)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        self.processor.close()
+        self.extractor.close()
+
+    def health(self):
+        depth = self.queue_depth()
+        return {
+            'status': 'ok',
+            'queue_depth': depth,
+            'max_queue': self.max_queue,
+            'job_workers': self.job_workers,
+            'accepting': depth < self.max_queue,
+        }
+
+class _MultipartReader:
+    """
+    Strumieniowy parser multipart/form-data - części plików nie są trzymane w pamięci
+    """
+
+    def __init__(self, stream, boundary: bytes, length: int):
+        self.stream = stream
+        self.remaining = length
+        self.delimiter = b"\r\n--" + boundary
+        # Początek treści traktujemy jak separator poprzedzony CRLF
+        self.buffer = b"\r\n"
+
+    def _fill(self):
+        if self.remaining <= 0:
+            return False
+        data = self.stream.read(min(CHUNK_SIZE, self.remaining))
+        if not data:
+            self.remaining = 0
+            return False
+        self.remaining -= len(data)
+        self.buffer += data
+        return True
+
+    def _iter_until_delimiter(self):
+        """
+        Dane do najbliższego separatora (separator zostaje zdjęty z bufora)
+        """
+        while True:
+            index = self.buffer.find(self.delimiter)
+            if index >= 0:
+                data, self.buffer = self.buffer[:index], self.buffer[index + len(self.delimiter):]
+                if data:
+                    yield data
+                return
+            # Zachowaj końcówkę, w której może zaczynać się separator
+            keep = len(self.delimiter) - 1
+            if len(self.buffer) > keep:
+                data, self.buffer = self.buffer[:-keep], self.buffer[-keep:]
+                yield data
+            if not self._fill():
+                raise ValueError("Niekompletne dane multipart")
+
+    def parts(self):
+        """
+        (nazwa pola, nazwa pliku, iterator kawałków) - kawałki trzeba odczytać przed kolejną częścią
+        """
+        for _ in self._iter_until_delimiter():
+            pass  # preambuła
+
+        while True:
+            while len(self.buffer) < 2 and self._fill():
+                pass
+            if self.buffer.startswith(b"--"):
+                return  # koniec treści
+
+            while b"\r\n\r\n" not in self.buffer:
+                if not self._fill():
+                    raise ValueError("Niekompletne nagłówki części multipart")
+            raw_headers, self.buffer = self.buffer.split(b"\r\n\r\n", 1)
+
+            headers = Message()
+            for line in raw_headers.decode('utf-8', 'replace').split("\r\n"):
+                if ":" in line:
+                    key, value = line.split(":", 1)
+                    headers[key.strip()] = value.strip()
+            name = headers.get_param('name', header='content-disposition')
+            filename = headers.get_param('filename', header='content-disposition')
+
+            data = self._iter_until_delimiter()
+            yield name, filename, data
+            for _ in data:
+                pass  # nieodczytana reszta części
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """
+    API usługi:
+      GET  /health                        - stan kolejki
+      PUT  /uploads                       - PDF w treści żądania (strumień) -> upload_id
+      POST /jobs                          - multipart (pdf1, pdf2, ...) albo JSON z upload_id -> 202 / 503
+      GET  /jobs/<id>                     - stan zadania
+      GET  /jobs/<id>/results             - wyniki stron jako NDJSON, strumieniowane na bieżąco
+      GET  /jobs/<id>/report?format=txt   - raport
+      GET  /jobs/<id>/archive             - ZIP zadania (strumień)
+      GET  /jobs/<id>/pages/<n>/thumbnail - miniatura różnic strony
+      GET  /jobs/<id>/pages/<n>/diff      - pełny obraz różnic (na żądanie)
+    """
+    protocol_version = "HTTP/1.1"
+    service: ComparisonService = None
+
+    # === ODPOWIEDZI ===
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, headers=None):
+        # Treść żądania mogła nie zostać odczytana do końca - połączenie nie nadaje się do ponownego użycia
+        self.close_connection = True
+        self._send_json(status, {'error': message}, headers)
+
+    def _send_file(self, path, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(os.path.getsize(path)))
+        self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(path)}"')
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+
+    def _send_chunked(self, content_type, chunks):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            if chunk:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    # === TREŚĆ ŻĄDANIA ===
+
+    def _iter_body(self):
+        """
+        Treść żądania kawałkami - Content-Length albo Transfer-Encoding: chunked
+        """
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return
+                remaining = size
+                while remaining:
+                    data = self.rfile.read(min(CHUNK_SIZE, remaining))
+                    if not data:
+                        raise ValueError("Przerwana treść żądania")
+                    remaining -= len(data)
+                    yield data
+                self.rfile.readline()
+        else:
+            remaining = int(self.headers.get("Content-Length", 0))
+            while remaining:
+                data = self.rfile.read(min(CHUNK_SIZE, remaining))
+                if not data:
+                    raise ValueError("Przerwana treść żądania")
+                remaining -= len(data)
+                yield data
+
+    def _read_json(self):
+        return json.loads(b"".join(self._iter_body()) or b"{}")
+
+    def _job_request_from_multipart(self):
+        content_type = Message()
+        content_type['content-type'] = self.headers.get("Content-Type", "")
+        boundary = content_type.get_param('boundary')
+        if not boundary:
+            raise ValueError("Brak boundary w Content-Type")
+
+        reader = _MultipartReader(self.rfile, boundary.encode('latin-1'),
+                                  int(self.headers.get("Content-Length", 0)))
+        fields = {}
+        for name, filename, data in reader.parts():
+            if filename is not None:
+                fields[name] = self.service.store_upload(data)
+            else:
+                fields[name] = b"".join(data).decode('utf-8')
+
+        if fields.get('ignore_template'):
+            fields['ignore_template'] = json.loads(fields['ignore_template'])
+        if 'use_cache' in fields:
+            fields['use_cache'] = fields['use_cache'].lower() not in ('0', 'false', 'no')
+        return fields
+
+    # === ROUTING ===
+
+    def do_PUT(self):
+        path = urlparse(self.path).path.rstrip("/")
+        if path != "/uploads":
+            return self._send_error(404, "Nie znaleziono")
+        try:
+            upload_id = self.service.store_upload(self._iter_body())
+        except ValueError as e:
+            return self._send_error(400, str(e))
+        self._send_json(201, {'upload_id': upload_id})
+
+    def do_POST(self):
+        path = urlparse(self.path).path.rstrip("/")
+        if path != "/jobs":
+            return self._send_error(404, "Nie znaleziono")
+
+        try:
+            if self.headers.get("Content-Type", "").startswith("multipart/form-data"):
+                request = self._job_request_from_multipart()
+            else:
+                request = self._read_json()
+            job = self.service.submit(
+                self.service.upload_path(request.get('pdf1')),
+                self.service.upload_path(request.get('pdf2')),
+                text_mode=request.get('text_mode', 'page'),
+                ignore_template=request.get('ignore_template'),
+                use_cache=request.get('use_cache', True),
+                visual_metric=request.get('visual_metric', 'threshold')
+            )
+        except QueueFullError as e:
+            return self._send_error(503, str(e), {"Retry-After": str(e.retry_after)})
+        except KeyError as e:
+            return self._send_error(400, str(e.args[0]))
+        except ValueError as e:
+            return self._send_error(400, str(e))
+
+        self._send_json(202, {
+            'job_id': job.job_id,
+            'status': job.status,
+            'status_url': f"/jobs/{job.job_id}",
+            'results_url': f"/jobs/{job.job_id}/results",
+        }, {"Location": f"/jobs/{job.job_id}"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+
+        if parts == ["health"]:
+            return self._send_json(200, self.service.health())
+        if len(parts) < 2 or parts[0] != "jobs":
+            return self._send_error(404, "Nie znaleziono")
+
+        try:
+            job = self.service.get_job(parts[1])
+        except KeyError as e:
+            return self._send_error(404, str(e.args[0]))
+
+        if len(parts) == 2:
+            return self._send_json(200, job.to_dict())
+
+        if parts[2:] == ["results"]:
+            return self._send_chunked("application/x-ndjson", self._iter_result_lines(job))
+
+        if parts[2] in ("report", "archive") and not job.finished:
+            return self._send_error(409, "Zadanie jeszcze trwa", {"Retry-After": "5"})
+
+        if parts[2:] == ["report"]:
+            fmt = parse_qs(url.query).get('format', [None])[0]
+            for path in job_report_files(job.report_file) if job.report_file else []:
+                if fmt is None or path.endswith(f".{fmt}"):
+                    if os.path.exists(path):
+                        content_type = "text/plain; charset=utf-8" if path.endswith(".txt") \
+                            else "application/x-ndjson"
+                        return self._send_file(path, content_type)
+            return self._send_error(404, "Brak raportu")
+
+        if parts[2:] == ["archive"]:
+            return self._send_chunked("application/zip", iter_job_archive(job.results, job.report_file))
+
+        if len(parts) == 5 and parts[2] == "pages" and parts[3].isdigit():
+            page_number = int(parts[3])
+            result = job.find_result(page_number)
+            if parts[4] == "thumbnail":
+                path = result.thumbnail_path if result else None
+            elif parts[4] == "diff":
+                try:
+                    path = self.service.highlighted_diff(job, page_number)
+                except (ValueError, OSError) as e:
+                    return self._send_error(500, f"Nie można wygenerować obrazu różnic: {e}")
+            else:
+                return self._send_error(404, "Nie znaleziono")
+            if not path or not os.path.exists(path):
+                return self._send_error(404, "Brak obrazu różnic dla tej strony")
+            content_type = {".webp": "image/webp", ".jpg": "image/jpeg"}.get(
+                os.path.splitext(path)[1], "image/png"
+            )
+            return self._send_file(path, content_type)
+
+        self._send_error(404, "Nie znaleziono")
+
+    def _iter_result_lines(self, job):
+        for result in job.iter_results():
+            record = result_to_dict(result)
+            record['severity'] = result_severity(result)
+            yield (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        yield (json.dumps({'type': 'end', 'status': job.status, 'error': job.error}) + "\n").encode('utf-8')
+
+    def log_message(self, format, *args):
+        print(f"🌐 {self.address_string()} {format % args}")
+
+def make_server(service: ComparisonService, host="127.0.0.1", port=8765) -> ThreadingHTTPServer:
+    handler = type("BoundServiceRequestHandler", (ServiceRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+class ServiceClient:
+    """
+    Prosty klient usługi (urllib) - np. dla aplikacji Streamlit
+    """
+
+    def __init__(self, base_url="http://127.0.0.1:8765", timeout=60):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method, path, data=None, headers=None, timeout=None):
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers=headers or {})
+        try:
+            return urllib.request.urlopen(request, timeout=timeout or self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 503:
+                raise QueueFullError(int(e.headers.get("Retry-After", "5")))
+            message = e.read().decode('utf-8', 'replace')
+            raise RuntimeError(f"Usługa zwróciła {e.code}: {message}")
+
+    def _json(self, method, path, payload=None):
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        with self._request(method, path, data, headers) as response:
+            return json.loads(response.read())
+
+    def health(self):
+        return self._json("GET", "/health")
+
+    def upload(self, pdf_path) -> str:
+        """
+        Przesyła PDF strumieniowo (PUT /uploads); zwraca upload_id
+        """
+        with open(pdf_path, 'rb') as f:
+            headers = {"Content-Type": "application/pdf",
+                       "Content-Length": str(os.path.getsize(pdf_path))}
+            with self._request("PUT", "/uploads", f, headers) as response:
+                return json.loads(response.read())['upload_id']
+
+    def submit(self, upload1, upload2, text_mode='page', ignore_template: IgnoreTemplate = None,
+               use_cache=True, visual_metric='threshold') -> str:
+        payload = {'pdf1': upload1, 'pdf2': upload2, 'text_mode': text_mode, 'use_cache': use_cache,
+                   'visual_metric': visual_metric}
+        if ignore_template:
+            payload['ignore_template'] = ignore_template.to_dict()
+        return self._json("POST", "/jobs", payload)['job_id']
+
+    def compare(self, pdf1_path, pdf2_path, max_wait=600, **options) -> str:
+        """
+        Przesyła oba pliki i zleca porównanie; przy pełnej kolejce czeka zgodnie z Retry-After
+        """
+        upload1, upload2 = self.upload(pdf1_path), self.upload(pdf2_path)
+        deadline = time.time() + max_wait
+        while True:
+            try:
+                return self.submit(upload1, upload2, **options)
+            except QueueFullError as e:
+                if time.time() + e.retry_after > deadline:
+                    raise
+                print(f"⏳ Kolejka usługi pełna - ponawiam za {e.retry_after} s")
+                time.sleep(e.retry_after)
+
+    def job(self, job_id):
+        return self._json("GET", f"/jobs/{job_id}")
+
+    def alignment(self, job_id):
+        return [PageMatch(**match) for match in self.job(job_id)['alignment']]
+
+    def iter_results(self, job_id):
+        """
+        Wyniki stron na bieżąco (NDJSON), jako HybridComparisonResult
+        """
+        with self._request("GET", f"/jobs/{job_id}/results", timeout=None) as response:
+            for line in response:
+                record = json.loads(line)
+                if record.get('type') == 'end':
+                    if record['status'] == JOB_FAILED:
+                        raise RuntimeError(f"Zadanie nieudane: {record['error']}")
+                    return
+                yield result_from_dict(record)
+
+    def download(self, job_id, kind, output_path, fmt=None) -> str:
+        """
+        Zapisuje raport ('report') albo archiwum ('archive') zadania na dysk strumieniowo
+        """
+        path = f"/jobs/{job_id}/{kind}" + (f"?format={fmt}" if fmt else "")
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with self._request("GET", path, timeout=None) as response, open(output_path, 'wb') as f:
+            shutil.copyfileobj(response, f, CHUNK_SIZE)
+        return output_path
+
+    def page_image(self, job_id, page_number, kind='thumbnail') -> bytes:
+        """
+        Miniatura ('thumbnail') albo pełny obraz różnic ('diff') strony
+        """
+        with self._request("GET", f"/jobs/{job_id}/pages/{page_number}/{kind}", timeout=None) as response:
+            return response.read()
+
+# Uruchomienie usługi
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Usługa porównywania PDF (HTTP)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2, help="równoległe zadania")
+    parser.add_argument("--max-queue", type=int, default=8, help="limit zadań w kolejce")
+    parser.add_argument("--work-root", default="service_jobs")
+    args = parser.parse_args()
+
+    service = ComparisonService(args.work_root, job_workers=args.workers, max_queue=args.max_queue)
+    server = make_server(service, args.host, args.port)
+    print(f"🌐 Usługa porównywania PDF: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Zatrzymuję usługę...")
+    finally:
+        server.server_close()
+        service.shutdown()
@@ -0,0 +1,133 @@
+import cv2
+import numpy as np
+import base64
+import zlib
+
+DEFAULT_TILE_SIZE = 16
+MAX_BOUNDING_BOXES = 256
+
+class DiffMask:
+    """
+    Kompaktowa maska różnic strony (zwykle kilka KB):
+    - runs: długości serii (RLE, zlib) maski binarnej w kolejności wierszy - dokładne odtworzenie
+    - tile_max: maksymalna różnica jasności w kafelkach tile_size x tile_size - ponowne progowanie
+    - bounding_boxes: prostokąty (x, y, w, h) obszarów zmian
+    """
+    __slots__ = ('height', 'width', 'runs', 'tile_size', 'tile_max', 'bounding_boxes')
+
+    def __init__(self, height, width, runs, tile_size, tile_max, bounding_boxes):
+        self.height = height
+        self.width = width
+        self.runs = runs
+        self.tile_size = tile_size
+        self.tile_max = tile_max
+        self.bounding_boxes = bounding_boxes
+
+    @classmethod
+    def from_threshold(cls, thresh, gray_diff=None, tile_size=DEFAULT_TILE_SIZE):
+        """
+        Buduje maskę z obrazu progowanego (0/255) i opcjonalnie mapy różnic w skali szarości
+        """
+        height, width = thresh.shape[:2]
+
+        # RLE: pozycje zmian wartości w spłaszczonej masce
+        flat = np.concatenate(([0], (thresh.ravel() > 0).view(np.uint8), [0]))
+        edges = np.flatnonzero(np.diff(flat))
+        starts, ends = edges[0::2], edges[1::2]
+        # Naprzemiennie: przerwa przed serią, długość serii
+        gaps = starts - np.concatenate(([0], ends[:-1]))
+        runs = np.empty(len(starts) * 2, dtype=np.uint32)
+        runs[0::2] = gaps
+        runs[1::2] = ends - starts
+
+        # Mapa kafelków: max różnicy (albo maski, gdy brak mapy różnic)
+        changed_tiles = _tile_max(thresh, tile_size) > 0
+        tiles = _tile_max(gray_diff, tile_size) if gray_diff is not None else changed_tiles * np.uint8(255)
+
+        return cls(
+            height, width, zlib.compress(runs.tobytes(), 6),
+            tile_size, zlib.compress(tiles.tobytes(), 6),
+            _bounding_boxes(changed_tiles, tile_size, height, width)
+        )
+
+    @property
+    def tile_shape(self):
+        return (-(-self.height // self.tile_size), -(-self.width // self.tile_size))
+
+    @property
+    def nbytes(self):
+        return len(self.runs) + len(self.tile_max) + 16 * len(self.bounding_boxes)
+
+    def to_array(self):
+        """
+        Pełnowymiarowa maska bool
+        """
+        runs = np.frombuffer(zlib.decompress(self.runs), dtype=np.uint32)
+        total = self.height * self.width
+
+        # Serie naprzemiennie: przerwa (False), zmiana (True); reszta po ostatniej serii to przerwa
+        values = np.tile(np.array([False, True]), len(runs) // 2)
+        mask = np.repeat(values, runs)
+        mask = np.concatenate((mask, np.zeros(total - len(mask), dtype=bool)))
+        return mask.reshape(self.height, self.width)
+
+    def tile_map(self):
+        """
+        Maksymalna różnica (0-255) w każdym kafelku
+        """
+        return np.frombuffer(zlib.decompress(self.tile_max), dtype=np.uint8).reshape(self.tile_shape)
+
+    def tiles_above(self, threshold):
+        """
+        Kafelki, które przekraczają inny próg niż użyty przy porównaniu (ponowne progowanie)
+        """
+        return self.tile_map() > threshold
+
+    def to_dict(self):
+        return {
+            'height': self.height,
+            'width': self.width,
+            'runs': base64.b64encode(self.runs).decode('ascii'),
+            'tile_size': self.tile_size,
+            'tile_max': base64.b64encode(self.tile_max).decode('ascii'),
+            'bounding_boxes': [list(box) for box in self.bounding_boxes],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['height'], data['width'], base64.b64decode(data['runs']),
+            data['tile_size'], base64.b64decode(data['tile_max']),
+            [tuple(box) for box in data['bounding_boxes']]
+        )
+
+    def __repr__(self):
+        return (f"DiffMask({self.width}x{self.height}, {len(self.bounding_boxes)} obszarów, "
+                f"{self.nbytes} B)")
+
+def _tile_max(image, tile_size):
+    """
+    Maksimum w kafelkach tile_size x tile_size (ostatni rząd/kolumna mogą być niepełne)
+    """
+    height, width = image.shape[:2]
+    tiles_h, tiles_w = -(-height // tile_size), -(-width // tile_size)
+    padded = np.zeros((tiles_h * tile_size, tiles_w * tile_size), dtype=np.uint8)
+    padded[:height, :width] = image
+    return padded.reshape(tiles_h, tile_size, tiles_w, tile_size).max(axis=(1, 3))
+
+def _bounding_boxes(tile_mask, tile_size, height, width):
+    """
+    Prostokąty spójnych obszarów zmienionych kafelków, w pikselach strony
+    """
+    count, _, stats, _ = cv2.connectedComponentsWithStats(tile_mask.astype(np.uint8), connectivity=8)
+
+    # Etykieta 0 to tło; największe obszary mają pierwszeństwo
+    components = sorted(stats[1:count], key=lambda s: s[cv2.CC_STAT_AREA], reverse=True)
+    boxes = []
+    for stat in components[:MAX_BOUNDING_BOXES]:
+        x = int(stat[cv2.CC_STAT_LEFT]) * tile_size
+        y = int(stat[cv2.CC_STAT_TOP]) * tile_size
+        w = min(int(stat[cv2.CC_STAT_WIDTH]) * tile_size, width - x)
+        h = min(int(stat[cv2.CC_STAT_HEIGHT]) * tile_size, height - y)
+        boxes.append((x, y, w, h))
+    return boxes
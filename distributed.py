@@ -0,0 +1,545 @@
+from hybrid_comparator import HybridComparator, HybridComparisonResult, result_to_dict, result_from_dict
+from pdf_processor import PDFProcessor
+from text_extractor import TextExtractor
+from page_aligner import PageAligner, PageMatch
+from page_budget import PageBudget
+from ignore_regions import IgnoreTemplate
+from fingerprints import file_digest
+from version_store import raster_digest
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Iterator, List
+import argparse
+import base64
+import hashlib
+import json
+import os
+import queue
+import select
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+# Ramka protokołu: 4 bajty długości (big-endian) + JSON w UTF-8
+_FRAME_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+def send_message(sock, message: dict):
+    data = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    sock.sendall(_FRAME_HEADER.pack(len(data)) + data)
+
+def _recv_exact(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(min(size - len(buffer), CHUNK_SIZE))
+        if not chunk:
+            raise ConnectionError("Połączenie zamknięte")
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+def recv_message(sock) -> dict:
+    (size,) = _FRAME_HEADER.unpack(_recv_exact(sock, _FRAME_HEADER.size))
+    if size > MAX_FRAME_SIZE:
+        raise ConnectionError(f"Za duża ramka: {size} B")
+    return json.loads(_recv_exact(sock, size))
+
+def send_file(sock, sha, path):
+    """
+    Nagłówek {"type": "file"} i surowa treść pliku (sendfile - bez kopiowania przez Pythona)
+    """
+    send_message(sock, {'type': 'file', 'sha': sha, 'size': os.path.getsize(path)})
+    with open(path, 'rb') as f:
+        sock.sendfile(f)
+
+def recv_file(sock, size, sha, output_path):
+    """
+    Odbiera plik strumieniowo i sprawdza jego SHA-256
+    """
+    temp_path = f"{output_path}.{uuid.uuid4().hex}.part"
+    digest = hashlib.sha256()
+    try:
+        with open(temp_path, 'wb') as f:
+            remaining = size
+            while remaining:
+                chunk = sock.recv(min(remaining, CHUNK_SIZE))
+                if not chunk:
+                    raise ConnectionError("Połączenie zamknięte w trakcie przesyłania pliku")
+                digest.update(chunk)
+                f.write(chunk)
+                remaining -= len(chunk)
+        if digest.hexdigest() != sha:
+            raise ConnectionError(f"Uszkodzony plik {sha[:12]} (niezgodny skrót)")
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return output_path
+
+def _page_runs(page_numbers):
+    """
+    Ciągłe zakresy stron (first, last) - każdy renderowany jednym procesem poppler
+    """
+    runs = []
+    for page_number in sorted(set(page_numbers)):
+        if runs and runs[-1][1] == page_number - 1:
+            runs[-1][1] = page_number
+        else:
+            runs.append([page_number, page_number])
+    return [tuple(run) for run in runs]
+
+@dataclass
+class _Task:
+    """Zakres par stron jednego porównania wysyłany do workera"""
+    job: '_DistributedJob'
+    index: int
+    pairs: List[tuple]  # (strona PDF1, strona PDF2, status dopasowania)
+    attempts: int = 0
+
+    def to_message(self):
+        return {
+            'type': 'task',
+            'task_id': f"{self.job.job_id}_{self.index}",
+            'pdf1': self.job.pdf1_sha,
+            'pdf2': self.job.pdf2_sha,
+            'pairs': [list(pair) for pair in self.pairs],
+            'ignore_template': self.job.ignore_template.to_dict() if self.job.ignore_template else None,
+            'budget': asdict(self.job.budget),
+            'visual_metric': self.job.visual_metric,
+        }
+
+@dataclass
+class _DistributedJob:
+    """Stan jednego rozproszonego porównania po stronie koordynatora"""
+    job_id: str
+    pdf1_sha: str
+    pdf2_sha: str
+    work_dir: str
+    ignore_template: IgnoreTemplate
+    budget: PageBudget
+    visual_metric: str = 'threshold'
+    results: Dict[int, list] = field(default_factory=dict)
+    error: str = None
+    without_workers_since: float = None  # time.monotonic() od chwili, gdy nie ma żadnego workera
+    changed: threading.Condition = field(default_factory=threading.Condition)
+
+class Coordinator:
+    """
+    Dzieli porównanie na zakresy par stron i rozsyła je do workerów przez TCP.
+    Zadania martwych workerów (zerwane połączenie albo przekroczony czas dzierżawy)
+    wracają do kolejki; wyniki oddawane są w kolejności stron.
+    """
+
+    def __init__(self, host="0.0.0.0", port=9500, pages_per_task=4, lease_seconds=600,
+                 max_attempts=3, work_dir="distributed_jobs", budget: PageBudget = None,
+                 align_dpi=36, worker_wait_seconds=60, job_timeout=None):
+        """
+        pages_per_task - liczba par stron w jednym zadaniu
+        lease_seconds - czas na wykonanie zadania; po nim worker uznawany jest za martwy
+        max_attempts - ile razy zadanie może trafić do workera, zanim porównanie się nie powiedzie
+        align_dpi - DPI podglądu do dopasowania stron (liczone lokalnie, tylko hash obrazu)
+        worker_wait_seconds - jak długo porównanie czeka na workera, gdy żaden nie jest połączony
+        job_timeout - limit czasu całego porównania w sekundach (None = bez limitu)
+        """
+        self.pages_per_task = pages_per_task
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_wait_seconds = worker_wait_seconds
+        self.job_timeout = job_timeout
+        self.work_dir = work_dir
+        self.budget = budget if budget is not None else PageBudget()
+        self.align_processor = PDFProcessor(dpi=align_dpi)
+        self.aligner = PageAligner(visual_weight=1.0)
+        self.last_alignment = []
+
+        self._files = {}  # sha -> ścieżka PDF udostępniana workerom
+        self._tasks = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+        self._server = socket.create_server((host, port))
+        self.address = self._server.getsockname()
+        threading.Thread(target=self._accept_loop, name="coordinator-accept", daemon=True).start()
+        print(f"🛰️ Koordynator nasłuchuje na {self.address[0]}:{self.address[1]}")
+
+    # === WORKERZY ===
+
+    def _accept_loop(self):
+        while not self._closed.is_set():
+            try:
+                conn, address = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve_worker, args=(conn, address), daemon=True).start()
+
+    @staticmethod
+    def _idle_connection_lost(conn):
+        """
+        Bezczynny worker niczego nie wysyła - gniazdo gotowe do odczytu oznacza EOF (worker zakończony)
+        """
+        readable, _, _ = select.select([conn], [], [], 0)
+        return bool(readable)
+
+    def worker_count(self):
+        with self._lock:
+            return len(self._workers)
+
+    def _serve_worker(self, conn, address):
+        """
+        Jedno połączenie = jeden worker; zadania wysyłane pojedynczo, wynik w czasie dzierżawy
+        """
+        conn.settimeout(self.lease_seconds)
+        try:
+            hello = recv_message(conn)
+            worker_id = hello.get('worker_id', f"{address[0]}:{address[1]}")
+        except (OSError, ValueError):
+            conn.close()
+            return
+
+        with self._lock:
+            self._workers.add(worker_id)
+        print(f"🤝 Worker {worker_id} dołączył")
+
+        task = None
+        try:
+            while not self._closed.is_set():
+                try:
+                    task = self._tasks.get(timeout=1.0)
+                except queue.Empty:
+                    if self._idle_connection_lost(conn):
+                        raise ConnectionError("połączenie zamknięte w bezczynności")
+                    continue
+                if task.job.error:
+                    task = None
+                    continue  # porównanie już przerwane
+
+                if self._idle_connection_lost(conn):
+                    # Worker padł przed otrzymaniem zadania - zadanie wraca bez liczenia próby
+                    self._tasks.put(task)
+                    task = None
+                    raise ConnectionError("połączenie zamknięte w bezczynności")
+                send_message(conn, task.to_message())
+                # Próba liczona dopiero po przekazaniu zadania
+                task.attempts += 1
+                while True:
+                    message = recv_message(conn)
+                    if message['type'] == 'need_file':
+                        send_file(conn, message['sha'], self._files[message['sha']])
+                    elif message['type'] == 'result':
+                        self._deliver(task, message['results'])
+                        break
+                    elif message['type'] == 'error':
+                        print(f"⚠️ Worker {worker_id}: zadanie {task.index} nieudane ({message['message']})")
+                        self._retry(task, message['message'])
+                        break
+                task = None
+        except (OSError, ValueError, KeyError) as e:
+            # Timeout dzierżawy, zerwane połączenie albo błędny protokół - worker uznany za martwy
+            print(f"💀 Worker {worker_id} niedostępny ({e.__class__.__name__})")
+            if task is not None:
+                self._retry(task, f"worker {worker_id} niedostępny")
+        finally:
+            with self._lock:
+                self._workers.discard(worker_id)
+            conn.close()
+
+    def _retry(self, task: _Task, reason):
+        if task.attempts >= self.max_attempts:
+            with task.job.changed:
+                task.job.error = f"Zadanie {task.index} nieudane po {task.attempts} próbach: {reason}"
+                task.job.changed.notify_all()
+            return
+        print(f"🔁 Zadanie {task.index} wraca do kolejki (próba {task.attempts}/{self.max_attempts})")
+        self._tasks.put(task)
+
+    def _deliver(self, task: _Task, results):
+        with task.job.changed:
+            task.job.results.setdefault(task.index, results)
+            task.job.changed.notify_all()
+
+    # === PORÓWNANIE ===
+
+    def _align(self, pdf1_path, pdf2_path, work_dir) -> List[PageMatch]:
+        """
+        Dopasowanie stron na podglądach w niskim DPI (hash obrazu) - zanim ruszą workerzy
+        """
+        images1, images2 = self.align_processor.render_documents([
+            (pdf1_path, os.path.join(work_dir, "align_pdf1")),
+            (pdf2_path, os.path.join(work_dir, "align_pdf2"))
+        ])
+        fingerprints1 = self.aligner.fingerprint_pages(images1, [""] * len(images1))
+        fingerprints2 = self.aligner.fingerprint_pages(images2, [""] * len(images2))
+        return self.aligner.align(fingerprints1, fingerprints2)
+
+    def compare(self, pdf1_path, pdf2_path, ignore_template: IgnoreTemplate = None,
+                visual_metric='threshold') -> Iterator[HybridComparisonResult]:
+        """
+        Rozproszone porównanie; wyniki sparowanych stron oddawane w kolejności dopasowania
+        """
+        job_id = uuid.uuid4().hex[:12]
+        work_dir = os.path.join(self.work_dir, job_id)
+        os.makedirs(work_dir, exist_ok=True)
+
+        job = _DistributedJob(job_id, file_digest(pdf1_path), file_digest(pdf2_path),
+                              work_dir, ignore_template, self.budget, visual_metric)
+        with self._lock:
+            self._files[job.pdf1_sha] = pdf1_path
+            self._files[job.pdf2_sha] = pdf2_path
+
+        print("🧩 Dopasowuję strony...")
+        self.last_alignment = self._align(pdf1_path, pdf2_path, work_dir)
+        for match in self.last_alignment:
+            if match.status == 'inserted':
+                print(f"➕ Strona {match.page2} w PDF2 nie ma odpowiednika (dodana)")
+            elif match.status == 'deleted':
+                print(f"➖ Strona {match.page1} z PDF1 nie występuje w PDF2 (usunięta)")
+
+        pairs = [(m.page1, m.page2, m.status) for m in self.last_alignment
+                 if m.status in ('matched', 'moved', 'changed')]
+        tasks = [_Task(job, index, pairs[start:start + self.pages_per_task])
+                 for index, start in enumerate(range(0, len(pairs), self.pages_per_task))]
+        print(f"📦 {len(pairs)} par stron w {len(tasks)} zadaniach (workerzy: {self.worker_count()})")
+        for task in tasks:
+            self._tasks.put(task)
+
+        deadline = time.monotonic() + self.job_timeout if self.job_timeout else None
+        for task in tasks:
+            with job.changed:
+                while task.index not in job.results and job.error is None:
+                    job.changed.wait(1.0)
+                    if job.error is None:
+                        self._check_progress(job, deadline)
+                if job.error is not None:
+                    raise RuntimeError(job.error)
+                payloads = job.results.pop(task.index)
+            for payload in payloads:
+                yield self._result_from_payload(payload, work_dir)
+
+    def _check_progress(self, job: _DistributedJob, deadline):
+        """
+        Przerywa porównanie bez workerów dłużej niż worker_wait_seconds albo po job_timeout
+        (wywoływane z zablokowanym job.changed; zadania w kolejce są potem pomijane)
+        """
+        now = time.monotonic()
+        if self.worker_count():
+            job.without_workers_since = None
+        elif job.without_workers_since is None:
+            job.without_workers_since = now
+            print(f"⏳ Brak połączonych workerów - czekam do {self.worker_wait_seconds} s")
+        elif now - job.without_workers_since >= self.worker_wait_seconds:
+            job.error = f"Brak workerów przez {self.worker_wait_seconds} s - porównanie przerwane"
+        if deadline is not None and now >= deadline:
+            job.error = f"Przekroczono limit czasu porównania ({self.job_timeout} s)"
+
+    def compare_pdfs(self, pdf1_path, pdf2_path, ignore_template: IgnoreTemplate = None,
+                     visual_metric='threshold'):
+        return list(self.compare(pdf1_path, pdf2_path, ignore_template, visual_metric))
+
+    def _result_from_payload(self, payload, work_dir) -> HybridComparisonResult:
+        """
+        Wynik od workera; miniatura zapisywana lokalnie (ścieżki workera tu nie istnieją)
+        """
+        thumbnail = payload.pop('thumbnail', None)
+        result = result_from_dict(payload)
+        if thumbnail:
+            diffs_folder = os.path.join(work_dir, "highlighted_diffs")
+            os.makedirs(diffs_folder, exist_ok=True)
+            result.thumbnail_path = os.path.join(
+                diffs_folder, f"page_{result.page_number}_thumb{thumbnail['ext']}"
+            )
+            with open(result.thumbnail_path, 'wb') as f:
+                f.write(base64.b64decode(thumbnail['data']))
+        return result
+
+    def close(self):
+        self._closed.set()
+        self._server.close()
+        self.align_processor.close()
+
+class Worker:
+    """
+    Worker (na innym hoście albo jako lokalny proces): render + OCR + diff przydzielonych par stron.
+    PDF-y pobierane od koordynatora tylko raz - cache po SHA-256.
+    """
+
+    def __init__(self, host="127.0.0.1", port=9500, cache_dir="worker_cache", worker_id=None):
+        self.host = host
+        self.port = port
+        self.cache_dir = cache_dir
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        os.makedirs(os.path.join(cache_dir, "pdfs"), exist_ok=True)
+
+        # Rozgrzane komponenty - współdzielone przez kolejne zadania
+        self.budget = None
+        self.processor = None
+        self.extractor = None
+
+    def _connect(self, retries=30, delay=1.0):
+        for attempt in range(retries):
+            try:
+                return socket.create_connection((self.host, self.port))
+            except OSError:
+                if attempt == retries - 1:
+                    raise
+                time.sleep(delay)
+
+    def run(self):
+        """
+        Pracuje do zamknięcia połączenia przez koordynatora
+        """
+        sock = self._connect()
+        send_message(sock, {'type': 'hello', 'worker_id': self.worker_id})
+        print(f"🔧 Worker {self.worker_id} połączony z {self.host}:{self.port}")
+        try:
+            while True:
+                try:
+                    task = recv_message(sock)
+                except ConnectionError:
+                    return
+                try:
+                    results = self.process_task(sock, task)
+                except (ConnectionError, socket.timeout):
+                    raise  # połączenie z koordynatorem zerwane - zadanie wróci do kolejki
+                except Exception as e:
+                    send_message(sock, {'type': 'error', 'task_id': task['task_id'], 'message': str(e)})
+                    continue
+                send_message(sock, {'type': 'result', 'task_id': task['task_id'], 'results': results})
+        finally:
+            sock.close()
+
+    def _fetch_pdf(self, sock, sha):
+        path = os.path.join(self.cache_dir, "pdfs", f"{sha}.pdf")
+        if not os.path.exists(path):
+            send_message(sock, {'type': 'need_file', 'sha': sha})
+            header = recv_message(sock)
+            recv_file(sock, header['size'], sha, path)
+            print(f"📥 Pobrano PDF {sha[:12]}")
+        return path
+
+    def _components(self, budget: PageBudget):
+        if budget != self.budget:
+            for component in (self.processor, self.extractor):
+                if component is not None:
+                    component.close()
+            self.budget = budget
+            self.processor = PDFProcessor(dpi=200, budget=budget)
+            self.extractor = TextExtractor(timeout=budget.ocr_seconds or 0)
+        return self.processor, self.extractor
+
+    def _render(self, processor, pdf_path, page_numbers, output_folder):
+        images = {}
+        for first_page, last_page in _page_runs(page_numbers):
+            for offset, path in enumerate(processor.render_pages(pdf_path, first_page, last_page, output_folder)):
+                images[first_page + offset] = path
+        return images
+
+    def process_task(self, sock, task) -> List[dict]:
+        pdf1_path = self._fetch_pdf(sock, task['pdf1'])
+        pdf2_path = self._fetch_pdf(sock, task['pdf2'])
+        processor, extractor = self._components(PageBudget(**task['budget']))
+        ignore_template = IgnoreTemplate.from_dict(task['ignore_template']) if task['ignore_template'] else None
+
+        work_dir = os.path.join(self.cache_dir, "tasks", task['task_id'])
+        comparator = HybridComparator(ignore_template=ignore_template, budget=self.budget,
+                                      processor=processor, extractor=extractor, work_dir=work_dir,
+                                      visual_metric=task.get('visual_metric', 'threshold'))
+        pairs = task['pairs']
+        print(f"⚙️ Zadanie {task['task_id']}: {len(pairs)} par stron")
+
+        images1 = images2 = {}
+        try:
+            images1 = self._render(processor, pdf1_path, [p1 for p1, _, _ in pairs], os.path.join(work_dir, "pdf1"))
+            images2 = self._render(processor, pdf2_path, [p2 for _, p2, _ in pairs], os.path.join(work_dir, "pdf2"))
+            os.makedirs(os.path.join(work_dir, "highlighted_diffs"), exist_ok=True)
+
+            results = []
+            for page1, page2, status in pairs:
+                img1_path, img2_path = images1[page1], images2[page2]
+                identical = raster_digest(img1_path) == raster_digest(img2_path)
+                text1 = text2 = ""
+                if not identical:
+                    text1 = extractor.extract_text_from_image(img1_path, ignore_template, page1)
+                    text2 = extractor.extract_text_from_image(img2_path, ignore_template, page2)
+                result = comparator.compare_page_pair(page1, page2, img1_path, img2_path, text1, text2,
+                                                      match_status=status, identical=identical)
+                results.append(self._payload(result))
+            return results
+        finally:
+            paths = list(images1.values()) + list(images2.values())
+            processor.release_pages(paths)
+            extractor.timed_out.difference_update(paths)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    @staticmethod
+    def _payload(result: HybridComparisonResult) -> dict:
+        """
+        Wynik do wysłania: maska różnic w środku, miniatura jako bajty; lokalne ścieżki pomijane
+        """
+        payload = result_to_dict(result)
+        if result.thumbnail_path and os.path.exists(result.thumbnail_path):
+            with open(result.thumbnail_path, 'rb') as f:
+                payload['thumbnail'] = {
+                    'ext': os.path.splitext(result.thumbnail_path)[1],
+                    'data': base64.b64encode(f.read()).decode('ascii'),
+                }
+        payload['thumbnail_path'] = None
+        payload['source_image_path'] = None
+        payload['highlighted_diff_path'] = None
+        return payload
+
+def spawn_local_workers(count, port, host="127.0.0.1", cache_root="worker_cache"):
+    """
+    Lokalne procesy workerów zamiast osobnych hostów (test na jednej maszynie)
+    """
+    return [
+        subprocess.Popen([
+            sys.executable, os.path.abspath(__file__), "worker",
+            "--host", host, "--port", str(port),
+            "--cache-dir", os.path.join(cache_root, f"worker_{index}"),
+            "--worker-id", f"local-{index}"
+        ])
+        for index in range(count)
+    ]
+
+# Uruchomienie: koordynator albo worker
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rozproszone porównanie PDF (koordynator / worker)")
+    subparsers = parser.add_subparsers(dest="role", required=True)
+
+    coordinator_parser = subparsers.add_parser("coordinator", help="porównanie rozproszone")
+    coordinator_parser.add_argument("pdf1")
+    coordinator_parser.add_argument("pdf2")
+    coordinator_parser.add_argument("--host", default="0.0.0.0")
+    coordinator_parser.add_argument("--port", type=int, default=9500)
+    coordinator_parser.add_argument("--pages-per-task", type=int, default=4)
+    coordinator_parser.add_argument("--local-workers", type=int, default=0,
+                                    help="uruchom N lokalnych procesów workerów")
+    coordinator_parser.add_argument("--ignore-template", help="szablon obszarów ignorowanych (JSON)")
+
+    worker_parser = subparsers.add_parser("worker", help="worker łączący się z koordynatorem")
+    worker_parser.add_argument("--host", default="127.0.0.1")
+    worker_parser.add_argument("--port", type=int, default=9500)
+    worker_parser.add_argument("--cache-dir", default="worker_cache")
+    worker_parser.add_argument("--worker-id")
+
+    args = parser.parse_args()
+
+    if args.role == "worker":
+        Worker(args.host, args.port, args.cache_dir, args.worker_id).run()
+    else:
+        coordinator = Coordinator(args.host, args.port, pages_per_task=args.pages_per_task)
+        processes = spawn_local_workers(args.local_workers, coordinator.address[1])
+        template = IgnoreTemplate.load(args.ignore_template) if args.ignore_template else None
+        try:
+            for result in coordinator.compare(args.pdf1, args.pdf2, template):
+                print(f"📄 Strona {result.page_number} ↔ {result.page_number_pdf2}: "
+                      f"{result.overall_similarity:.2%}")
+        finally:
+            coordinator.close()
+            for process in processes:
+                process.wait(timeout=30)
@@ -0,0 +1,279 @@
+from pdf_processor import PDFProcessor
+from text_extractor import TextExtractor
+from fingerprints import (
+    perceptual_hash, hash_similarity, text_shingles, file_digest,
+    minhash_signature, minhash_similarity, HASH_SIZE, MINHASH_PERMUTATIONS, EMPTY_MINHASH_VALUE
+)
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List
+import numpy as np
+import hashlib
+import os
+import shutil
+import sqlite3
+import zlib
+
+# LSH: MinHash tekstu dzielony na pasma po 4 wartości, hash obrazu na pasma po 32 bity
+TEXT_BAND_ROWS = 4
+IMAGE_BAND_BITS = 32
+IMAGE_BAND_OFFSET = 1000  # numery pasm obrazu nie kolidują z pasmami tekstu
+IMAGE_BAND_MIN_BITS = 4   # pasma prawie stałe (puste marginesy: dHash = 0) nie są indeksowane
+
+@dataclass
+class IndexMatch:
+    """Kandydat z biblioteki dla zapytania"""
+    document_id: int
+    path: str
+    score: float
+    matched_pages: int
+    page_count: int
+
+@dataclass
+class PageSignature:
+    """Odcisk strony przechowywany w indeksie"""
+    page_number: int
+    image_hash: int
+    minhash: np.ndarray = field(repr=False)
+
+class DocumentIndex:
+    def __init__(self, db_path="document_index.db", dpi=150):
+        """
+        db_path - plik bazy SQLite z indeksem
+        dpi - rozdzielczość renderowania do odcisków (wystarczająca dla OCR)
+        """
+        self.db_path = db_path
+        self.processor = PDFProcessor(dpi=dpi)
+        self.extractor = TextExtractor()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._create_schema()
+
+    def _create_schema(self):
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                file_hash TEXT NOT NULL,
+                page_count INTEGER NOT NULL,
+                indexed_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+                page_number INTEGER NOT NULL,
+                image_hash TEXT NOT NULL,
+                minhash BLOB NOT NULL,
+                PRIMARY KEY (document_id, page_number)
+            );
+            CREATE TABLE IF NOT EXISTS lsh_buckets (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                document_id INTEGER NOT NULL,
+                page_number INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_lsh_bucket ON lsh_buckets(band, bucket);
+            CREATE INDEX IF NOT EXISTS idx_lsh_document ON lsh_buckets(document_id);
+            CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(file_hash);
+        """)
+        self.conn.commit()
+
+    # === BUDOWA ODCISKÓW ===
+
+    def fingerprint_document(self, pdf_path) -> List[PageSignature]:
+        """
+        Renderuje i OCR-uje PDF, zwraca odciski wszystkich stron
+        """
+        work_folder = os.path.join("temp_index", hashlib.md5(pdf_path.encode('utf-8')).hexdigest())
+        try:
+            image_paths = self.processor.pdf_to_images(pdf_path, work_folder)
+            texts = self.extractor.extract_text_from_pdf_images(image_paths)
+            return [
+                PageSignature(
+                    page_number=i + 1,
+                    image_hash=perceptual_hash(image_path),
+                    minhash=minhash_signature(text_shingles(texts.get(f"page_{i+1}", "")))
+                )
+                for i, image_path in enumerate(image_paths)
+            ]
+        finally:
+            shutil.rmtree(work_folder, ignore_errors=True)
+
+    @staticmethod
+    def _page_buckets(signature: PageSignature):
+        """
+        Klucze LSH strony: (pasmo, kubełek)
+        """
+        buckets = []
+        # Puste strony mają identyczną sygnaturę - nie mogą trafiać do wspólnych kubełków tekstu
+        if not np.all(signature.minhash == EMPTY_MINHASH_VALUE):
+            for band, start in enumerate(range(0, MINHASH_PERMUTATIONS, TEXT_BAND_ROWS)):
+                rows = signature.minhash[start:start + TEXT_BAND_ROWS]
+                buckets.append((band, zlib.crc32(rows.tobytes())))
+
+        hash_bits = HASH_SIZE * HASH_SIZE
+        for band, shift in enumerate(range(0, hash_bits, IMAGE_BAND_BITS)):
+            chunk = (signature.image_hash >> shift) & ((1 << IMAGE_BAND_BITS) - 1)
+            # Jak puste sygnatury tekstu: wspólny kubełek wszystkich stron z pustym marginesem
+            # zamieniłby wyszukiwanie w pełny skan biblioteki
+            set_bits = bin(chunk).count("1")
+            if min(set_bits, IMAGE_BAND_BITS - set_bits) < IMAGE_BAND_MIN_BITS:
+                continue
+            buckets.append((IMAGE_BAND_OFFSET + band, chunk))
+
+        return buckets
+
+    # === INDEKSOWANIE ===
+
+    def add_document(self, pdf_path) -> int:
+        """
+        Dodaje (lub odświeża) dokument w indeksie
+        """
+        pdf_path = os.path.abspath(pdf_path)
+        file_hash = file_digest(pdf_path)
+
+        row = self.conn.execute(
+            "SELECT id, file_hash FROM documents WHERE path = ?", (pdf_path,)
+        ).fetchone()
+        if row and row[1] == file_hash:
+            print(f"⏭️ Już zindeksowany: {pdf_path}")
+            return row[0]
+
+        print(f"📚 Indeksuję: {pdf_path}")
+        signatures = self.fingerprint_document(pdf_path)
+
+        with self.conn:
+            if row:
+                self._remove_document_rows(row[0])
+            cursor = self.conn.execute(
+                "INSERT INTO documents (path, file_hash, page_count, indexed_at) VALUES (?, ?, ?, ?)",
+                (pdf_path, file_hash, len(signatures), datetime.now().isoformat(timespec='seconds'))
+            )
+            document_id = cursor.lastrowid
+
+            self.conn.executemany(
+                "INSERT INTO pages (document_id, page_number, image_hash, minhash) VALUES (?, ?, ?, ?)",
+                [
+                    (document_id, s.page_number, format(s.image_hash, 'x'), s.minhash.tobytes())
+                    for s in signatures
+                ]
+            )
+            self.conn.executemany(
+                "INSERT INTO lsh_buckets (band, bucket, document_id, page_number) VALUES (?, ?, ?, ?)",
+                [
+                    (band, bucket, document_id, s.page_number)
+                    for s in signatures
+                    for band, bucket in self._page_buckets(s)
+                ]
+            )
+
+        print(f"✅ Zindeksowano {len(signatures)} stron")
+        return document_id
+
+    def add_directory(self, folder):
+        """
+        Indeksuje wszystkie PDF-y z folderu (rekurencyjnie)
+        """
+        document_ids = []
+        for root, _, filenames in os.walk(folder):
+            for filename in sorted(filenames):
+                if filename.lower().endswith('.pdf'):
+                    document_ids.append(self.add_document(os.path.join(root, filename)))
+        return document_ids
+
+    def remove_document(self, pdf_path):
+        row = self.conn.execute(
+            "SELECT id FROM documents WHERE path = ?", (os.path.abspath(pdf_path),)
+        ).fetchone()
+        if row:
+            with self.conn:
+                self._remove_document_rows(row[0])
+
+    def _remove_document_rows(self, document_id):
+        self.conn.execute("DELETE FROM lsh_buckets WHERE document_id = ?", (document_id,))
+        self.conn.execute("DELETE FROM pages WHERE document_id = ?", (document_id,))
+        self.conn.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+
+    # === WYSZUKIWANIE ===
+
+    def query(self, pdf_path, top_k=5) -> List[IndexMatch]:
+        """
+        Znajduje top_k najbardziej podobnych dokumentów z biblioteki
+        """
+        return self.query_signatures(self.fingerprint_document(pdf_path), top_k)
+
+    def query_signatures(self, signatures: List[PageSignature], top_k=5) -> List[IndexMatch]:
+        """
+        Wyszukiwanie po gotowych odciskach - tylko odczyty z indeksu LSH
+        """
+        if not signatures:
+            return []
+
+        # Krok 1: kandydaci z kubełków LSH (dokładne porównanie tylko dla nich)
+        candidate_pages = {}
+        for signature in signatures:
+            buckets = self._page_buckets(signature)
+            if not buckets:
+                continue  # pusta strona - brak informacji do wyszukiwania
+            placeholders = " OR ".join(["(band = ? AND bucket = ?)"] * len(buckets))
+            params = [value for bucket in buckets for value in bucket]
+            for document_id, page_number in self.conn.execute(
+                f"SELECT DISTINCT document_id, page_number FROM lsh_buckets WHERE {placeholders}", params
+            ):
+                candidate_pages.setdefault(document_id, set()).add(page_number)
+
+        if not candidate_pages:
+            return []
+
+        # Krok 2: dokładniejsze podobieństwo stron-kandydatów
+        matches = []
+        for document_id, page_numbers in candidate_pages.items():
+            path, page_count = self.conn.execute(
+                "SELECT path, page_count FROM documents WHERE id = ?", (document_id,)
+            ).fetchone()
+            placeholders = ", ".join("?" * len(page_numbers))
+            stored = [
+                (int(image_hash, 16), np.frombuffer(minhash, dtype=np.uint32))
+                for image_hash, minhash in self.conn.execute(
+                    f"SELECT image_hash, minhash FROM pages WHERE document_id = ? "
+                    f"AND page_number IN ({placeholders})",
+                    [document_id, *page_numbers]
+                )
+            ]
+
+            # Każda strona zapytania bierze najlepiej pasującą stronę kandydata
+            total = 0.0
+            matched_pages = 0
+            for signature in signatures:
+                best = max(
+                    0.5 * hash_similarity(signature.image_hash, image_hash)
+                    + 0.5 * minhash_similarity(signature.minhash, minhash)
+                    for image_hash, minhash in stored
+                )
+                total += best
+                matched_pages += best >= 0.5
+
+            # Normalizacja przez dłuższy dokument - kara za brakujące strony
+            score = total / max(len(signatures), page_count)
+            matches.append(IndexMatch(document_id, path, score, matched_pages, page_count))
+
+        matches.sort(key=lambda match: match.score, reverse=True)
+        return matches[:top_k]
+
+    def find_and_compare(self, pdf_path, comparator, top_k=3):
+        """
+        Pełne porównanie hybrydowe tylko z top_k kandydatami z indeksu
+        """
+        candidates = self.query(pdf_path, top_k)
+        comparisons = []
+        for candidate in candidates:
+            print(f"\n🔎 Kandydat: {candidate.path} (wynik {candidate.score:.2%})")
+            results = comparator.compare_pdfs_hybrid(candidate.path, pdf_path)
+            comparisons.append((candidate, results))
+        return comparisons
+
+    def close(self):
+        self.conn.close()
+
+# Test modułu
+if __name__ == "__main__":
+    index = DocumentIndex()
+    print("Document Index gotowy!")
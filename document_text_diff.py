@@ -0,0 +1,183 @@
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+import difflib
+
+# Luki bez unikalnych kotwic porównujemy difflibem tylko do tego rozmiaru (n*m)
+MAX_FALLBACK_CELLS = 250_000
+
+@dataclass
+class DocumentTextDiff:
+    """Wynik diffu całego dokumentu, przypisany z powrotem do stron"""
+    deleted: Dict[int, List[str]] = field(default_factory=dict)   # strona PDF1 -> usunięte linie
+    inserted: Dict[int, List[str]] = field(default_factory=dict)  # strona PDF2 -> dodane linie
+    line_counts1: Dict[int, int] = field(default_factory=dict)
+    line_counts2: Dict[int, int] = field(default_factory=dict)
+    moved_lines: int = 0
+
+    def page_pair_differences(self, page1: int, page2: int) -> List[str]:
+        """
+        Różnice pary stron w formacie unified diff (--- / +++ / -linia / +linia)
+        """
+        deleted = self.deleted.get(page1, [])
+        inserted = self.inserted.get(page2, [])
+        if not deleted and not inserted:
+            return []
+        return (
+            [f"--- PDF1_page_{page1}", f"+++ PDF2_page_{page2}"]
+            + [f"-{line}" for line in deleted]
+            + [f"+{line}" for line in inserted]
+        )
+
+    def page_pair_similarity(self, page1: int, page2: int) -> float:
+        """
+        Udział niezmienionych linii w parze stron (przesunięta treść liczy się jako niezmieniona)
+        """
+        total1 = self.line_counts1.get(page1, 0)
+        total2 = self.line_counts2.get(page2, 0)
+        if total1 + total2 == 0:
+            return 1.0
+        unchanged = (total1 - len(self.deleted.get(page1, []))) + (total2 - len(self.inserted.get(page2, [])))
+        return unchanged / (total1 + total2)
+
+def _document_lines(texts: Dict[str, str], page_count: int) -> List[Tuple[int, str]]:
+    """
+    Linie całego dokumentu jako (numer strony, znormalizowana linia); puste linie pomijane
+    """
+    lines = []
+    for page in range(1, page_count + 1):
+        for line in texts.get(f"page_{page}", "").splitlines():
+            line = " ".join(line.split())
+            if line:
+                lines.append((page, line))
+    return lines
+
+def _unique_anchors(a, b, a_lo, a_hi, b_lo, b_hi):
+    """
+    Kotwice: linie występujące dokładnie raz w obu zakresach, najdłuższy rosnący ciąg (patience diff)
+    """
+    counts = {}
+    for i in range(a_lo, a_hi):
+        entry = counts.setdefault(a[i], [0, 0, i, 0])
+        entry[0] += 1
+    for j in range(b_lo, b_hi):
+        entry = counts.get(b[j])
+        if entry is not None:
+            entry[1] += 1
+            entry[3] = j
+
+    pairs = sorted((i, j) for count_a, count_b, i, j in counts.values() if count_a == 1 and count_b == 1)
+    if not pairs:
+        return []
+
+    # Najdłuższy rosnący podciąg po pozycji w b - O(k log k)
+    tails, tail_index, previous = [], [], [None] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        position = bisect_left(tails, j)
+        if position == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[position] = j
+            tail_index[position] = k
+        previous[k] = tail_index[position - 1] if position else None
+
+    anchors = []
+    k = tail_index[-1]
+    while k is not None:
+        anchors.append(pairs[k])
+        k = previous[k]
+    anchors.reverse()
+    return anchors
+
+def diff_line_hashes(a: List[int], b: List[int]):
+    """
+    Diff dwóch list hashy linii. Zwraca (indeksy usunięte z a, indeksy dodane w b).
+    Prawie liniowy dla dokumentów z unikalnymi liniami (kotwice), difflib tylko dla małych luk.
+    """
+    deleted, inserted = [], []
+    stack = [(0, len(a), 0, len(b))]
+
+    while stack:
+        a_lo, a_hi, b_lo, b_hi = stack.pop()
+
+        # Wspólny początek i koniec
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            a_lo, b_lo = a_lo + 1, b_lo + 1
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi, b_hi = a_hi - 1, b_hi - 1
+
+        if a_lo == a_hi or b_lo == b_hi:
+            deleted.extend(range(a_lo, a_hi))
+            inserted.extend(range(b_lo, b_hi))
+            continue
+
+        anchors = _unique_anchors(a, b, a_lo, a_hi, b_lo, b_hi)
+        if anchors:
+            # Luki między kotwicami rozwiązywane osobno
+            previous_i, previous_j = a_lo, b_lo
+            for i, j in anchors:
+                stack.append((previous_i, i, previous_j, j))
+                previous_i, previous_j = i + 1, j + 1
+            stack.append((previous_i, a_hi, previous_j, b_hi))
+            continue
+
+        if (a_hi - a_lo) * (b_hi - b_lo) <= MAX_FALLBACK_CELLS:
+            matcher = difflib.SequenceMatcher(None, a[a_lo:a_hi], b[b_lo:b_hi], autojunk=False)
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if tag != 'equal':
+                    deleted.extend(range(a_lo + i1, a_lo + i2))
+                    inserted.extend(range(b_lo + j1, b_lo + j2))
+        else:
+            deleted.extend(range(a_lo, a_hi))
+            inserted.extend(range(b_lo, b_hi))
+
+    deleted.sort()
+    inserted.sort()
+    return deleted, inserted
+
+def diff_documents(text1: Dict[str, str], text2: Dict[str, str],
+                   page_count1: int, page_count2: int) -> DocumentTextDiff:
+    """
+    Jeden diff całego tekstu obu dokumentów; zmiany przypisane do stron, z których pochodzą.
+    Tekst przeniesiony na inną stronę (reflow) nie jest raportowany jako różnica.
+    """
+    lines1 = _document_lines(text1, page_count1)
+    lines2 = _document_lines(text2, page_count2)
+
+    deleted_idx, inserted_idx = diff_line_hashes(
+        [hash(line) for _, line in lines1],
+        [hash(line) for _, line in lines2]
+    )
+
+    # Linia usunięta w jednym miejscu i dodana w innym = przeniesienie, nie edycja
+    deleted_lines = {}
+    for i in deleted_idx:
+        deleted_lines.setdefault(lines1[i][1], []).append(i)
+    moved1, moved2 = set(), set()
+    for j in inserted_idx:
+        candidates = deleted_lines.get(lines2[j][1])
+        if candidates:
+            moved1.add(candidates.pop())
+            moved2.add(j)
+
+    result = DocumentTextDiff(moved_lines=len(moved2))
+    for page, _ in lines1:
+        result.line_counts1[page] = result.line_counts1.get(page, 0) + 1
+    for page, _ in lines2:
+        result.line_counts2[page] = result.line_counts2.get(page, 0) + 1
+    for i in deleted_idx:
+        if i not in moved1:
+            page, line = lines1[i]
+            result.deleted.setdefault(page, []).append(line)
+    for j in inserted_idx:
+        if j not in moved2:
+            page, line = lines2[j]
+            result.inserted.setdefault(page, []).append(line)
+
+    return result
+
+# Test modułu
+if __name__ == "__main__":
+    diff = diff_documents({'page_1': "a\nb\nc"}, {'page_1': "a\nb", 'page_2': "c\nd"}, 1, 2)
+    print(f"Document Text Diff gotowy! (dodane: {diff.inserted}, przeniesione: {diff.moved_lines})")
@@ -0,0 +1,90 @@
+from PIL import Image
+import numpy as np
+import hashlib
+import random
+import re
+import zlib
+
+HASH_SIZE = 16  # dHash 16x16 = 256 bitów (8x8 za mało rozróżnia białe strony dokumentów)
+SHINGLE_SIZE = 3
+MINHASH_PERMUTATIONS = 64
+_MINHASH_PRIME = 4294967311  # pierwsza liczba pierwsza > 2^32
+EMPTY_MINHASH_VALUE = 0xFFFFFFFF
+
+# Stałe współczynniki permutacji - sygnatury muszą być porównywalne między uruchomieniami
+_minhash_rng = random.Random(20240601)
+_MINHASH_A = np.array([_minhash_rng.randrange(1, 2**32) for _ in range(MINHASH_PERMUTATIONS)], dtype=np.uint64)
+_MINHASH_B = np.array([_minhash_rng.randrange(0, 2**32) for _ in range(MINHASH_PERMUTATIONS)], dtype=np.uint64)
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """
+    SHA-256 pliku liczony strumieniowo
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def perceptual_hash(image_path, hash_size=HASH_SIZE):
+    """
+    Perceptual hash strony (dHash) jako liczba całkowita hash_size*hash_size bitów
+    """
+    with Image.open(image_path) as image:
+        small = image.convert('L').resize(
+            (hash_size + 1, hash_size), Image.BOX, reducing_gap=3.0
+        )
+
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | int(pixels[offset + col] > pixels[offset + col + 1])
+
+    return bits
+
+def hash_similarity(hash1, hash2, hash_size=HASH_SIZE):
+    """
+    Podobieństwo dwóch hashy (0-1) na podstawie odległości Hamminga
+    """
+    return 1.0 - (hash1 ^ hash2).bit_count() / (hash_size * hash_size)
+
+def text_shingles(text, size=SHINGLE_SIZE):
+    """
+    Zbiór shingli (kolejnych n słów) jako stabilne 32-bitowe hashe
+    """
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode('utf-8'))} if words else set()
+
+    return {
+        zlib.crc32(" ".join(words[i:i + size]).encode('utf-8'))
+        for i in range(len(words) - size + 1)
+    }
+
+def jaccard_similarity(shingles1, shingles2):
+    """
+    Podobieństwo Jaccarda dwóch zbiorów shingli
+    """
+    if not shingles1 and not shingles2:
+        return 1.0
+    return len(shingles1 & shingles2) / len(shingles1 | shingles2)
+
+def minhash_signature(shingles):
+    """
+    Sygnatura MinHash zbioru shingli (MINHASH_PERMUTATIONS wartości uint32)
+    """
+    if not shingles:
+        return np.full(MINHASH_PERMUTATIONS, EMPTY_MINHASH_VALUE, dtype=np.uint32)
+
+    values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    # (a*x + b) mod p dla wszystkich permutacji naraz; a, x < 2^32 więc iloczyn mieści się w uint64
+    hashed = (np.outer(_MINHASH_A, values) + _MINHASH_B[:, None]) % np.uint64(_MINHASH_PRIME)
+    return hashed.min(axis=1).astype(np.uint32)
+
+def minhash_similarity(signature1, signature2):
+    """
+    Estymata podobieństwa Jaccarda z dwóch sygnatur MinHash
+    """
+    return float(np.mean(signature1 == signature2))
@@ -1,18 +1,27 @@
 from pdf_processor import PDFProcessor
 from text_extractor import TextExtractor
 from visual_comparator import VisualComparator
+from diff_mask import DiffMask
+from ignore_regions import IgnoreTemplate
+from page_aligner import PageAligner, PageFingerprint
+from document_text_diff import diff_documents
+from page_budget import (
+    PageBudget, DEGRADED_RENDER_SKIPPED, DEGRADED_OCR_TIMEOUT, DEGRADED_DIFF_DOWNSCALED
+)
+from PIL import Image
 import difflib
-from dataclasses import dataclass
+import subprocess
+from dataclasses import dataclass, fields
 from typing import List, Dict
 import os
 
-@dataclass
+@dataclass(slots=True)
 class HybridComparisonResult:
-    """Rozszerzona struktura wyników - OCR + Vision"""
+    """Rozszerzona struktura wyników - OCR + Vision (slots - lekkie przy tysiącach stron)"""
     page_number: int
     # OCR results
     text_differences: List[str]
-    text_similarity_score: float
+    text_similarity_score: float  # None = brak OCR (limit czasu) - strona tylko z analizą wizualną
     has_text_differences: bool
     # Visual results
     visual_similarity_score: float
@@ -21,26 +30,141 @@ class HybridComparisonResult:
     has_visual_differences: bool
     # Combined
     overall_similarity: float
-    highlighted_diff_path: str = None
+    highlighted_diff_path: str = None  # pełny podgląd - generowany na żądanie
+    # Artefakty różnic (tylko strony z różnicami)
+    diff_mask: DiffMask = None
+    thumbnail_path: str = None
+    source_image_path: str = None
+    # Dopasowanie stron
+    page_number_pdf2: int = None
+    match_status: str = 'matched'
+    # Tryb uproszczony po przekroczeniu limitów strony (flagi z page_budget)
+    degradation: List[str] = None
+    # Podobieństwo strukturalne (tylko visual_metric='ssim') - średnie SSIM i mapa kafelków
+    structural_similarity_score: float = None
+    structural_map: List[List[float]] = None
+    
+    @property
+    def degraded(self) -> bool:
+        return bool(self.degradation)
+    
+    @property
+    def worst_tile_similarity(self) -> float:
+        """Najniższe SSIM kafelka strony (None bez mapy SSIM)"""
+        if not self.structural_map:
+            return None
+        return min(min(row) for row in self.structural_map)
+
+# Progi klasyfikacji (podobieństwo ogólne)
+SEVERITY_CRITICAL = 'critical'
+SEVERITY_MODERATE = 'moderate'
+SEVERITY_MINOR = 'minor'
+SEVERITY_IDENTICAL = 'identical'
+
+# Kafelek z SSIM poniżej progu to zmiana strukturalna (nie szum renderowania) - co najmniej moderate
+SSIM_TILE_MODERATE = 0.5
+
+def classify_severity(overall_similarity: float, worst_tile: float = None) -> str:
+    """
+    Klasa różnic strony: critical (< 50%), moderate (50-90%), minor (90-99%), identical.
+    worst_tile - najniższe SSIM kafelka; lokalna zmiana struktury podnosi klasę do moderate
+    """
+    if overall_similarity < 0.5:
+        return SEVERITY_CRITICAL
+    elif overall_similarity < 0.9:
+        return SEVERITY_MODERATE
+    elif worst_tile is not None and worst_tile < SSIM_TILE_MODERATE:
+        return SEVERITY_MODERATE
+    elif overall_similarity < 1.0:
+        return SEVERITY_MINOR
+    return SEVERITY_IDENTICAL
+
+def result_severity(result: 'HybridComparisonResult') -> str:
+    """
+    Klasa różnic wyniku strony (z mapą SSIM, jeśli była liczona)
+    """
+    return classify_severity(result.overall_similarity, result.worst_tile_similarity)
+
+def result_to_dict(result: HybridComparisonResult) -> dict:
+    """Wynik jako słownik gotowy do JSON"""
+    data = {f.name: getattr(result, f.name) for f in fields(result)}
+    if result.diff_mask is not None:
+        data['diff_mask'] = result.diff_mask.to_dict()
+    return data
+
+def result_from_dict(data: dict) -> HybridComparisonResult:
+    """Odtwarza wynik ze słownika (nieznane klucze są pomijane)"""
+    known = {f.name for f in fields(HybridComparisonResult)}
+    values = {k: v for k, v in data.items() if k in known}
+    if values.get('diff_mask') is not None:
+        values['diff_mask'] = DiffMask.from_dict(values['diff_mask'])
+    return HybridComparisonResult(**values)
 
 class HybridComparator:
-    def __init__(self):
-        self.processor = PDFProcessor(dpi=200)
-        self.extractor = TextExtractor()
-        self.visual_comparator = VisualComparator(threshold=30)
+    TEXT_MODES = ('page', 'document')
+    VISUAL_METRICS = ('threshold', 'ssim')
+    
+    def __init__(self, ignore_template: IgnoreTemplate = None, text_mode: str = 'page',
+                 budget: PageBudget = None, processor: PDFProcessor = None,
+                 extractor: TextExtractor = None, work_dir: str = ".",
+                 visual_metric: str = 'threshold'):
+        """
+        ignore_template - obszary pomijane w diffie i OCR (wspólne dla całej serii zadań)
+        text_mode - 'page': diff tekstu strona do strony, 'document': jeden diff całego dokumentu
+                    (tekst przelany na inną stronę nie jest raportowany jako zmiana)
+        budget - limity czasu/pikseli na stronę (domyślnie PageBudget())
+        processor, extractor - współdzielone (rozgrzane) komponenty, np. w usłudze HTTP
+        work_dir - katalog na rastry i podglądy (osobny dla każdego zadania usługi)
+        visual_metric - 'threshold': podobieństwo wizualne w wyniku ogólnym to odsetek pikseli bez różnic,
+                        'ssim': SSIM (odporne na antyaliasing i szum renderowania) z mapą kafelków
+        """
+        if text_mode not in self.TEXT_MODES:
+            raise ValueError(f"Nieznany tryb tekstu: {text_mode} (dostępne: {', '.join(self.TEXT_MODES)})")
+        if visual_metric not in self.VISUAL_METRICS:
+            raise ValueError(f"Nieznana miara wizualna: {visual_metric} "
+                             f"(dostępne: {', '.join(self.VISUAL_METRICS)})")
+        self.ignore_template = ignore_template
+        self.text_mode = text_mode
+        self.visual_metric = visual_metric
+        self.budget = budget if budget is not None else PageBudget()
+        self.processor = processor or PDFProcessor(dpi=200, budget=self.budget)
+        self.extractor = extractor or TextExtractor(timeout=self.budget.ocr_seconds or 0)
+        self.work_dir = work_dir
+        self.visual_comparator = VisualComparator(threshold=30, max_pixels=self.budget.diff_pixels)
+        self.aligner = PageAligner()
+        self.last_alignment = []
+    
+    def settings_key(self) -> str:
+        """
+        Ustawienia wpływające na wynik - wyniki z innymi ustawieniami nie są współdzielone
+        """
+        settings = f"dpi={self.processor.dpi};threshold={self.visual_comparator.threshold}"
+        if self.ignore_template:
+            settings += f";ignore={self.ignore_template.key()}"
+        if self.text_mode != 'page':
+            settings += f";text={self.text_mode}"
+        if self.visual_metric != 'threshold':
+            settings += f";visual={self.visual_metric}"
+        return settings
     
     def compare_pdfs_hybrid(self, pdf1_path: str, pdf2_path: str):
         """
         Hybrydowe porównanie: OCR + Computer Vision
         """
+        return list(self.iter_compare_pdfs_hybrid(pdf1_path, pdf2_path))
+    
+    def iter_compare_pdfs_hybrid(self, pdf1_path: str, pdf2_path: str):
+        """
+        Jak compare_pdfs_hybrid, ale zwraca wyniki stron na bieżąco (generator)
+        """
         print("🔍 Rozpoczynam hybrydowe porównanie PDF-ów...")
         
-        # Krok 1: Konwertuj oba PDF-y
-        print("\n📄 Konwertuję pierwszy PDF...")
-        images1 = self.processor.pdf_to_images(pdf1_path, "temp_pdf1")
-        
-        print("\n📄 Konwertuję drugi PDF...")
-        images2 = self.processor.pdf_to_images(pdf2_path, "temp_pdf2")
+        # Krok 1: Konwertuj oba PDF-y jednocześnie
+        print("\n📄 Konwertuję oba PDF-y...")
+        images1, images2 = self.processor.render_documents([
+            (pdf1_path, os.path.join(self.work_dir, "temp_pdf1")),
+            (pdf2_path, os.path.join(self.work_dir, "temp_pdf2"))
+        ])
         
         # Sprawdź czy mają tyle samo stron
         if len(images1) != len(images2):
@@ -48,72 +172,285 @@ class HybridComparator:
         
         # Krok 2: Analiza OCR
         print("\n🔍 Analiza tekstowa (OCR)...")
-        text1 = self.extractor.extract_text_from_pdf_images(images1)
-        text2 = self.extractor.extract_text_from_pdf_images(images2)
+        text1 = self.extractor.extract_text_from_pdf_images(images1, self.ignore_template)
+        text2 = self.extractor.extract_text_from_pdf_images(images2, self.ignore_template)
         
-        # Krok 3: Analiza wizualna + hybrydowe porównanie
-        results = []
-        max_pages = max(len(images1), len(images2))
+        yield from self.iter_compare_prepared(images1, images2, text1, text2)
+    
+    def compare_prepared(self, images1: List[str], images2: List[str],
+                         text1: Dict[str, str], text2: Dict[str, str], **kwargs):
+        """
+        Porównanie na gotowych obrazach i tekstach OCR (np. z magazynu wersji).
+        Strony o identycznym skrócie rastra nie są ponownie analizowane.
+        """
+        return list(self.iter_compare_prepared(images1, images2, text1, text2, **kwargs))
+    
+    def iter_compare_prepared(self, images1: List[str], images2: List[str],
+                              text1: Dict[str, str], text2: Dict[str, str],
+                              fingerprints1: List[PageFingerprint] = None,
+                              fingerprints2: List[PageFingerprint] = None,
+                              digests1: List[str] = None, digests2: List[str] = None):
+        """
+        Generator wyników compare_prepared - strona po stronie
+        """
+        # Krok 3: Dopasowanie stron (wstawione / usunięte / przestawione)
+        print("\n🧩 Dopasowuję strony...")
+        if fingerprints1 is None:
+            fingerprints1 = self.aligner.fingerprint_pages(
+                images1, [text1.get(f"page_{i+1}", "") for i in range(len(images1))]
+            )
+        if fingerprints2 is None:
+            fingerprints2 = self.aligner.fingerprint_pages(
+                images2, [text2.get(f"page_{i+1}", "") for i in range(len(images2))]
+            )
+        self.last_alignment = self.aligner.align(fingerprints1, fingerprints2)
+        
+        # Tryb dokumentu: jeden diff całego tekstu, różnice przypisane do par stron
+        document_diff = None
+        if self.text_mode == 'document':
+            print("\n📜 Porównuję tekst całych dokumentów...")
+            document_diff = diff_documents(text1, text2, len(images1), len(images2))
+            if document_diff.moved_lines:
+                print(f"   ↪️ Linie przeniesione między stronami: {document_diff.moved_lines}")
         
+        # Krok 4: Analiza wizualna + hybrydowe porównanie tylko dla sparowanych stron
         # Stwórz folder na highlighted różnice
-        os.makedirs("highlighted_diffs", exist_ok=True)
+        os.makedirs(self._diffs_folder(), exist_ok=True)
         
-        for i in range(max_pages):
-            page_num = i + 1
-            print(f"\n📊 Analizuję stronę {page_num} (OCR + Vision)...")
+        for match in self.last_alignment:
+            if match.status == 'inserted':
+                print(f"\n➕ Strona {match.page2} w PDF2 nie ma odpowiednika (dodana)")
+                continue
+            if match.status == 'deleted':
+                print(f"\n➖ Strona {match.page1} z PDF1 nie występuje w PDF2 (usunięta)")
+                continue
+            if match.status == 'changed':
+                print(f"\n✏️ Strony {match.page1} ↔ {match.page2} sparowane mimo niskiego podobieństwa (przepisane)")
             
-            # Pobierz ścieżki obrazów
-            img1_path = images1[i] if i < len(images1) else None
-            img2_path = images2[i] if i < len(images2) else None
+            text_result = None
+            if document_diff is not None:
+                text_result = (
+                    document_diff.page_pair_differences(match.page1, match.page2),
+                    document_diff.page_pair_similarity(match.page1, match.page2)
+                )
             
-            if img1_path and img2_path:
-                result = self._compare_page_hybrid(
-                    page_num, 
-                    text1.get(f"page_{page_num}", ""),
-                    text2.get(f"page_{page_num}", ""),
-                    img1_path,
-                    img2_path
+            yield self.compare_page_pair(
+                match.page1, match.page2,
+                images1[match.page1 - 1], images2[match.page2 - 1],
+                text1.get(f"page_{match.page1}", ""),
+                text2.get(f"page_{match.page2}", ""),
+                match_status=match.status,
+                identical=bool(digests1 and digests2
+                               and digests1[match.page1 - 1] == digests2[match.page2 - 1]),
+                text_result=text_result
+            )
+    
+    def compare_page_pair(self, page1: int, page2: int, img1_path: str, img2_path: str,
+                          text1: str, text2: str, match_status: str = 'matched',
+                          identical: bool = False, text_result=None) -> HybridComparisonResult:
+        """
+        Porównanie jednej sparowanej pary stron (np. zadanie workera w trybie rozproszonym).
+        identical - rastry mają ten sam skrót, analiza jest pomijana
+        """
+        degradation = self._page_degradation(img1_path, img2_path)
+        if DEGRADED_RENDER_SKIPPED in degradation:
+            print(f"\n⚠️ Strona {page1} ↔ {page2}: pominięta (limit czasu renderowania)")
+            return self._skipped_page_result(page1, page2, match_status, degradation)
+        
+        if identical:
+            print(f"\n⏭️ Strona {page1} ↔ {page2}: identyczny raster, pomijam analizę")
+            return self._identical_page_result(page1, page2, img2_path, match_status)
+        
+        print(f"\n📊 Analizuję stronę {page1} ↔ {page2} (OCR + Vision)...")
+        
+        if DEGRADED_OCR_TIMEOUT in degradation:
+            text_result = ([], None)  # tylko analiza wizualna
+        
+        return self._compare_page_hybrid(
+            page1, text1, text2, img1_path, img2_path,
+            page_num2=page2,
+            match_status=match_status,
+            text_result=text_result,
+            degradation=degradation
+        )
+    
+    def _diffs_folder(self) -> str:
+        return os.path.join(self.work_dir, "highlighted_diffs")
+    
+    def _page_degradation(self, img1_path: str, img2_path: str) -> List[str]:
+        """
+        Flagi trybu uproszczonego pary stron (render i OCR obu dokumentów)
+        """
+        degradation = []
+        for path in (img1_path, img2_path):
+            flag = self.processor.degraded_pages.get(path)
+            if flag and flag not in degradation:
+                degradation.append(flag)
+            if path in self.extractor.timed_out and DEGRADED_OCR_TIMEOUT not in degradation:
+                degradation.append(DEGRADED_OCR_TIMEOUT)
+        return degradation
+    
+    def _compare_visual(self, page_num: int, img1_path: str, img2_path: str, thumbnail_path: str):
+        """
+        Diff wizualny: duże strony kafelkami w pełnym DPI, pozostałe - cały raster naraz
+        """
+        tiled1 = self.processor.tiled_pages.get(img1_path)
+        tiled2 = self.processor.tiled_pages.get(img2_path)
+        structural = self.visual_metric == 'ssim'
+        
+        if tiled1 and tiled2 and tiled1.factor == tiled2.factor:
+            try:
+                visual_result = self.visual_comparator.compare_tiled(
+                    tiled1, tiled2, self.processor.render_tile,
+                    tile_size=self.budget.tile_size,
+                    preview_path=img1_path,
+                    thumbnail_path=thumbnail_path,
+                    ignore_template=self.ignore_template,
+                    page_number=page_num
+                )
+                # SSIM liczone i tak na pomniejszonym rastrze - wystarczą podglądy
+                visual_result['structural_similarity'], visual_result['structural_map'] = (
+                    self.visual_comparator.compare_structure(
+                        img1_path, img2_path, self.ignore_template, page_num
+                    ) if structural else (None, None)
                 )
-                results.append(result)
+                return visual_result
+            except (subprocess.SubprocessError, ValueError) as e:
+                print(f"   ⚠️ Porównanie kafelkami nieudane ({e}) - porównuję podglądy")
         
-        return results
+        visual_result = self.visual_comparator.compare_images(
+            img1_path, img2_path,
+            thumbnail_path=thumbnail_path,
+            ignore_template=self.ignore_template,
+            page_number=page_num,
+            structural=structural
+        )
+        # Podgląd dużej strony zamiast pełnego DPI - wynik przybliżony
+        if tiled1 or tiled2:
+            visual_result['downscaled'] = True
+        return visual_result
     
-    def _compare_page_hybrid(self, page_num: int, text1: str, text2: str, 
-                           img1_path: str, img2_path: str) -> HybridComparisonResult:
+    def _skipped_page_result(self, page_num: int, page_num2: int, match_status: str,
+                             degradation: List[str]) -> HybridComparisonResult:
         """
-        Hybrydowe porównanie pojedynczej strony
+        Wynik strony, której nie udało się wyrenderować w limicie - do ręcznego sprawdzenia
         """
-        # === ANALIZA TEKSTOWA (OCR) ===
-        text_similarity = difflib.SequenceMatcher(None, text1, text2).ratio()
-        
-        differ = difflib.unified_diff(
-            text1.splitlines(keepends=True),
-            text2.splitlines(keepends=True),
-            fromfile=f'PDF1_page_{page_num}',
-            tofile=f'PDF2_page_{page_num}',
-            lineterm=''
+        return HybridComparisonResult(
+            page_number=page_num,
+            text_differences=[],
+            text_similarity_score=0.0,
+            has_text_differences=False,
+            visual_similarity_score=0.0,
+            different_pixels=0,
+            total_pixels=0,
+            has_visual_differences=False,
+            overall_similarity=0.0,
+            page_number_pdf2=page_num2,
+            match_status=match_status,
+            degradation=degradation
         )
+    
+    def get_highlighted_diff(self, result: HybridComparisonResult) -> str:
+        """
+        Pełnowymiarowy obraz z podświetlonymi różnicami - tworzony przy pierwszym żądaniu
+        """
+        if result.highlighted_diff_path and os.path.exists(result.highlighted_diff_path):
+            return result.highlighted_diff_path
+        if result.diff_mask is None:
+            return None  # strona identyczna
         
-        text_differences = list(differ)
+        output_path = os.path.join(
+            os.path.dirname(result.thumbnail_path) if result.thumbnail_path else self._diffs_folder(),
+            f"page_{result.page_number}_diff.png"
+        )
+        result.highlighted_diff_path = self.visual_comparator.render_highlight_from_mask(
+            result.source_image_path, result.diff_mask, output_path
+        )
+        return result.highlighted_diff_path
+    
+    def _identical_page_result(self, page_num: int, page_num2: int, img_path: str,
+                               match_status: str) -> HybridComparisonResult:
+        """
+        Wynik dla stron o identycznym rastrze - bez OCR diff i analizy wizualnej
+        """
+        with Image.open(img_path) as image:
+            width, height = image.size
+        
+        return HybridComparisonResult(
+            page_number=page_num,
+            text_differences=[],
+            text_similarity_score=1.0,
+            has_text_differences=False,
+            visual_similarity_score=1.0,
+            different_pixels=0,
+            total_pixels=width * height,
+            has_visual_differences=False,
+            overall_similarity=1.0,
+            page_number_pdf2=page_num2,
+            match_status=match_status,
+            structural_similarity_score=1.0 if self.visual_metric == 'ssim' else None
+        )
+    
+    def _compare_page_hybrid(self, page_num: int, text1: str, text2: str, 
+                           img1_path: str, img2_path: str, page_num2: int = None,
+                           match_status: str = 'matched',
+                           text_result=None, degradation: List[str] = None) -> HybridComparisonResult:
+        """
+        Hybrydowe porównanie pojedynczej strony.
+        text_result - gotowe (różnice, podobieństwo) z diffu dokumentu; None = diff strony;
+                      podobieństwo None = strona bez OCR (tylko analiza wizualna)
+        degradation - flagi trybu uproszczonego ustalone przed porównaniem
+        """
+        degradation = list(degradation or [])
+        if page_num2 is None:
+            page_num2 = page_num
+        
+        # === ANALIZA TEKSTOWA (OCR) ===
+        if text_result is not None:
+            text_differences, text_similarity = text_result
+        else:
+            text_similarity = difflib.SequenceMatcher(None, text1, text2).ratio()
+            
+            differ = difflib.unified_diff(
+                text1.splitlines(keepends=True),
+                text2.splitlines(keepends=True),
+                fromfile=f'PDF1_page_{page_num}',
+                tofile=f'PDF2_page_{page_num2}',
+                lineterm=''
+            )
+            
+            text_differences = list(differ)
         has_text_differences = len(text_differences) > 0
         
         # === ANALIZA WIZUALNA (Computer Vision) ===
-        visual_result = self.visual_comparator.compare_images(img1_path, img2_path)
+        # Maska i miniatura powstają tylko dla stron z różnicami; pełny obraz - na żądanie
+        visual_result = self._compare_visual(
+            page_num, img1_path, img2_path,
+            os.path.join(self._diffs_folder(), f"page_{page_num}_thumb.webp")
+        )
         visual_similarity = visual_result['similarity']
         different_pixels = visual_result['different_pixels']
         total_pixels = visual_result['total_pixels']
         has_visual_differences = different_pixels > 0
-        
-        # Stwórz highlighted diff
-        highlighted_path = f"highlighted_diffs/page_{page_num}_diff.png"
-        self.visual_comparator.create_highlighted_diff(img1_path, img2_path, highlighted_path)
+        if visual_result['downscaled']:
+            degradation.append(DEGRADED_DIFF_DOWNSCALED)
+        structural_similarity = visual_result.get('structural_similarity')
+        # Do wyniku ogólnego: SSIM (jeśli liczone) albo odsetek pikseli bez różnic
+        visual_score = structural_similarity if structural_similarity is not None else visual_similarity
         
         # === KOMBINACJA WYNIKÓW ===
-        # Średnia ważona: 60% vision, 40% OCR (vision jest bardziej precyzyjne)
-        overall_similarity = (visual_similarity * 0.6) + (text_similarity * 0.4)
+        if text_similarity is None:
+            # Brak OCR (limit czasu) - wynik tylko z analizy wizualnej
+            print(f"   📝 Podobieństwo tekstowe: pominięte (limit czasu OCR)")
+            overall_similarity = visual_score
+        else:
+            # Średnia ważona: 60% vision, 40% OCR (vision jest bardziej precyzyjne)
+            overall_similarity = (visual_score * 0.6) + (text_similarity * 0.4)
+            print(f"   📝 Podobieństwo tekstowe: {text_similarity:.2%}")
         
-        print(f"   📝 Podobieństwo tekstowe: {text_similarity:.2%}")
         print(f"   👁️ Podobieństwo wizualne: {visual_similarity:.2%}")
+        if structural_similarity is not None:
+            print(f"   🧱 Podobieństwo strukturalne (SSIM): {structural_similarity:.2%}")
         print(f"   🎯 Podobieństwo ogólne: {overall_similarity:.2%}")
         
         return HybridComparisonResult(
@@ -129,7 +466,15 @@ class HybridComparator:
             has_visual_differences=has_visual_differences,
             # Combined
             overall_similarity=overall_similarity,
-            highlighted_diff_path=highlighted_path
+            diff_mask=visual_result['diff_mask'],
+            thumbnail_path=visual_result['thumbnail_path'],
+            source_image_path=img1_path,
+            # Dopasowanie
+            page_number_pdf2=page_num2,
+            match_status=match_status,
+            degradation=degradation or None,
+            structural_similarity_score=structural_similarity,
+            structural_map=visual_result.get('structural_map')
         )
 
 # Test modułu
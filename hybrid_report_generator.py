@@ -1,151 +1,194 @@
-from hybrid_comparator import HybridComparator, HybridComparisonResult
+from hybrid_comparator import HybridComparator
+from results_store import ResultsStore
+from report_writer import REPORT_WRITERS
+from fingerprints import file_digest
+from ignore_regions import IgnoreTemplate
 from datetime import datetime
-from typing import List
+import shutil
 import os
 
 class HybridReportGenerator:
-    def __init__(self):
-        self.comparator = HybridComparator()
-    
-    def generate_hybrid_report(self, pdf1_path: str, pdf2_path: str, output_file: str = None):
+    def __init__(self, results_store: ResultsStore = None, formats=('txt', 'jsonl'),
+                 ignore_template: IgnoreTemplate = None, text_mode: str = 'page',
+                 comparator: HybridComparator = None, visual_metric: str = 'threshold',
+                 artifacts_dir: str = "comparison_artifacts", keep_artifacts: int = 20):
         """
-        Generuje kompletny hybrydowy raport (OCR + Vision)
+        results_store - magazyn wyników (domyślnie lokalny comparison_results.db)
+        formats - formaty raportu z REPORT_WRITERS; pierwszy jest raportem głównym
+        ignore_template - obszary pomijane w porównaniu (np. znaczniki czasu druku)
+        text_mode - 'page' lub 'document' (diff tekstu całego dokumentu, odporny na przelewanie tekstu)
+        comparator - gotowy komparator (np. z rozgrzanymi pulami usługi); wtedy ignore_template,
+                     text_mode, visual_metric i artifacts_dir są pomijane, a pliki trafiają do jego work_dir
+        visual_metric - 'threshold' lub 'ssim' (podobieństwo strukturalne z mapą kafelków)
+        artifacts_dir - rastry i podglądy; każde porównanie ma własny podkatalog, którego kolejne
+                        porównania nie nadpisują (zapisane wyniki wskazują na swoje pliki)
+        keep_artifacts - ile ostatnich porównań trzyma pliki na dysku; starsze przy ponownym
+                         użyciu są porównywane od nowa
         """
-        if output_file is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_file = f"hybrid_report_{timestamp}.txt"
-        
-        # Wykonaj hybrydowe porównanie
-        results = self.comparator.compare_pdfs_hybrid(pdf1_path, pdf2_path)
-        
-        # Generuj raport
-        report_content = self._create_hybrid_report(pdf1_path, pdf2_path, results)
+        for fmt in formats:
+            if fmt not in REPORT_WRITERS:
+                raise ValueError(f"Nieznany format raportu: {fmt}")
         
-        # Zapisz do pliku
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(report_content)
-        
-        print(f"\n📄 Hybrydowy raport zapisany: {output_file}")
-        return output_file, results
+        self.comparator = comparator or HybridComparator(
+            ignore_template=ignore_template, text_mode=text_mode, visual_metric=visual_metric
+        )
+        self.results_store = results_store if results_store is not None else ResultsStore()
+        self.formats = formats
+        self.artifacts_dir = None if comparator else artifacts_dir
+        self.keep_artifacts = max(1, keep_artifacts)
     
-    def _create_hybrid_report(self, pdf1_path: str, pdf2_path: str, results: List[HybridComparisonResult]) -> str:
+    def _comparison_dir(self, comparison_id) -> str:
+        return os.path.join(self.artifacts_dir, f"comparison_{comparison_id}")
+    
+    def _artifacts_available(self, results, comparison_id) -> bool:
         """
-        Tworzy kompletny hybrydowy raport
+        Pliki zapisanego wyniku istnieją i należą do tego porównania (a nie do nadpisanego
+        wspólnego katalogu innego porównania)
         """
-        report = []
-        
-        # Nagłówek raportu
-        report.append("=" * 80)
-        report.append("HYBRYDOWY RAPORT PORÓWNANIA PDF (OCR + COMPUTER VISION)")
-        report.append("=" * 80)
-        report.append(f"Data analizy: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        report.append(f"PDF 1: {pdf1_path}")
-        report.append(f"PDF 2: {pdf2_path}")
-        report.append(f"Metoda: Hybrydowa (60% Computer Vision + 40% OCR)")
-        report.append("")
-        
-        # Podsumowanie wykonawcze
-        pages_with_differences = sum(1 for r in results if r.overall_similarity < 1.0)
-        avg_overall = sum(r.overall_similarity for r in results) / len(results) if results else 0
-        avg_visual = sum(r.visual_similarity_score for r in results) / len(results) if results else 0
-        avg_text = sum(r.text_similarity_score for r in results) / len(results) if results else 0
+        own_dir = os.path.abspath(self._comparison_dir(comparison_id)) + os.sep if self.artifacts_dir else None
+        for result in results:
+            for path in (result.thumbnail_path, result.source_image_path if result.diff_mask else None):
+                if not path:
+                    continue
+                if not os.path.exists(path):
+                    return False
+                if own_dir and not os.path.abspath(path).startswith(own_dir):
+                    return False
+        return True
+    
+    def _rehome_artifacts(self, results):
+        """
+        Kopie (twarde dowiązania) plików zapisanego wyniku w work_dir komparatora -
+        katalog porównania źródłowego może zostać usunięty (np. zakończone zadanie usługi)
+        """
+        work_dir = self.comparator.work_dir
+        for result in results:
+            for attribute, folder in (('thumbnail_path', "highlighted_diffs"),
+                                      ('source_image_path', "cached_sources")):
+                path = getattr(result, attribute)
+                if not path or (attribute == 'source_image_path' and result.diff_mask is None):
+                    continue
+                target_dir = os.path.join(work_dir, folder)
+                os.makedirs(target_dir, exist_ok=True)
+                target = os.path.join(target_dir, os.path.basename(path))
+                if os.path.abspath(path) != os.path.abspath(target):
+                    if os.path.exists(target):
+                        os.remove(target)
+                    try:
+                        os.link(path, target)
+                    except OSError:
+                        shutil.copy2(path, target)
+                setattr(result, attribute, target)
+            # Pełny podgląd generowany ponownie z kopii rastra
+            result.highlighted_diff_path = None
+    
+    def generate_hybrid_report(self, pdf1_path: str, pdf2_path: str, output_file: str = None,
+                               use_cache: bool = True, on_result=None):
+        """
+        Generuje kompletny hybrydowy raport (OCR + Vision), zapisując każdą stronę od razu na dysk
+        use_cache - zwróć zapisany wynik, jeśli ta para była już porównana
+        on_result - wywoływane z wynikiem każdej strony zaraz po jej zapisaniu (np. strumień w usłudze)
+        """
+        pdf1_hash = file_digest(pdf1_path)
+        pdf2_hash = file_digest(pdf2_path)
+        settings = self.comparator.settings_key()
         
-        report.append("PODSUMOWANIE WYKONAWCZE")
-        report.append("-" * 40)
-        report.append(f"Łączna liczba stron: {len(results)}")
-        report.append(f"Strony z różnicami: {pages_with_differences}")
-        report.append(f"Strony identyczne: {len(results) - pages_with_differences}")
-        report.append(f"Średnie podobieństwo OGÓLNE: {avg_overall:.2%}")
-        report.append(f"Średnie podobieństwo WIZUALNE: {avg_visual:.2%}")
-        report.append(f"Średnie podobieństwo TEKSTOWE: {avg_text:.2%}")
-        report.append("")
+        if use_cache:
+            stored = self.results_store.find_latest(pdf1_hash, pdf2_hash, settings)
+            if stored and stored.report_file and os.path.exists(stored.report_file):
+                results = self.results_store.load_results(stored.comparison_id)
+                if self._artifacts_available(results, stored.comparison_id):
+                    print(f"♻️ Para już porównana ({stored.created_at}) - używam zapisanego wyniku")
+                    self.comparator.last_alignment = stored.alignment
+                    if self.artifacts_dir:
+                        self.comparator.work_dir = self._comparison_dir(stored.comparison_id)
+                    else:
+                        self._rehome_artifacts(results)
+                    if on_result:
+                        for result in results:
+                            on_result(result)
+                    return stored.report_file, results
+                print("⚠️ Brak plików zapisanego wyniku (podglądy nadpisane lub usunięte) - porównuję ponownie")
         
-        # Klasyfikacja różnic
-        critical_pages = [r for r in results if r.overall_similarity < 0.5]
-        moderate_pages = [r for r in results if 0.5 <= r.overall_similarity < 0.9]
-        minor_pages = [r for r in results if 0.9 <= r.overall_similarity < 1.0]
+        if output_file is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_file = f"hybrid_report_{timestamp}.{self.formats[0]}"
         
-        report.append("KLASYFIKACJA RÓŻNIC (na podstawie analizy hybrydowej)")
-        report.append("-" * 50)
-        report.append(f"🔴 Różnice krytyczne (< 50%): {len(critical_pages)} stron")
-        report.append(f"🟡 Różnice średnie (50-90%): {len(moderate_pages)} stron")
-        report.append(f"🟢 Różnice drobne (90-99%): {len(minor_pages)} stron")
-        report.append("")
+        comparison_id = self.results_store.start_comparison(
+            pdf1_hash, pdf2_hash, pdf1_path, pdf2_path, settings
+        )
+        if self.artifacts_dir:
+            self.comparator.work_dir = self._comparison_dir(comparison_id)
         
-        # Szczegółowa analiza strona po stronie
-        report.append("SZCZEGÓŁOWA ANALIZA HYBRYDOWA STRONA PO STRONIE")
-        report.append("=" * 60)
+        # Pozostałe formaty obok głównego pliku (ta sama nazwa, inne rozszerzenie)
+        base_name = os.path.splitext(output_file)[0]
+        work_dir = self.comparator.work_dir
+        writers = [REPORT_WRITERS[self.formats[0]](output_file, pdf1_path, pdf2_path, work_dir)]
+        for fmt in self.formats[1:]:
+            writers.append(REPORT_WRITERS[fmt](f"{base_name}.{fmt}", pdf1_path, pdf2_path, work_dir))
         
-        for result in results:
-            report.append(f"\nSTRONA {result.page_number}")
-            report.append("-" * 30)
-            
-            # Wyniki hybrydowe
-            report.append(f"🎯 PODOBIEŃSTWO OGÓLNE: {result.overall_similarity:.2%}")
-            report.append(f"   👁️ Analiza wizualna (CV): {result.visual_similarity_score:.2%}")
-            report.append(f"   📝 Analiza tekstowa (OCR): {result.text_similarity_score:.2%}")
+        results = []
+        try:
+            for writer in writers:
+                writer.write_header()
             
-            # Klasyfikacja
-            if result.overall_similarity < 0.5:
-                severity = "🔴 KRYTYCZNA"
-            elif result.overall_similarity < 0.9:
-                severity = "🟡 ŚREDNIA"
-            elif result.overall_similarity < 1.0:
-                severity = "🟢 DROBNA"
-            else:
-                severity = "✅ IDENTYCZNA"
+            # Wykonaj hybrydowe porównanie - każda strona trafia do raportu i bazy od razu
+            for result in self.comparator.iter_compare_pdfs_hybrid(pdf1_path, pdf2_path):
+                for writer in writers:
+                    writer.write_page(result)
+                self.results_store.add_page_result(comparison_id, result)
+                results.append(result)
+                if on_result:
+                    on_result(result)
             
-            report.append(f"⚠️ Klasyfikacja: {severity}")
-            
-            # Szczegóły wizualne
-            report.append(f"\n📊 ANALIZA WIZUALNA:")
-            report.append(f"   Różne piksele: {result.different_pixels:,}")
-            report.append(f"   Całkowite piksele: {result.total_pixels:,}")
-            report.append(f"   Procent różnic: {(result.different_pixels/result.total_pixels)*100:.2f}%")
-            report.append(f"   Highlighted diff: {result.highlighted_diff_path}")
-            
-            # Szczegóły tekstowe
-            if result.has_text_differences:
-                report.append(f"\n📝 ANALIZA TEKSTOWA:")
-                report.append(f"   Liczba linii z różnicami: {len(result.text_differences)}")
-                
-                # Pokaż różnice tekstowe
-                for diff in result.text_differences:
-                    if diff.startswith('---') or diff.startswith('+++'):
-                        continue
-                    elif diff.startswith('-'):
-                        report.append(f"   USUNIĘTO: {diff[1:].strip()}")
-                    elif diff.startswith('+'):
-                        report.append(f"   DODANO:   {diff[1:].strip()}")
-            else:
-                report.append(f"\n📝 ANALIZA TEKSTOWA: Brak różnic tekstowych")
-            
-            report.append("")
+            for writer in writers:
+                writer.write_summary(self.comparator.last_alignment)
+        finally:
+            for writer in writers:
+                writer.close()
         
-        # Rekomendacje
-        report.append("REKOMENDACJE")
-        report.append("-" * 20)
-        if pages_with_differences == 0:
-            report.append("✅ Dokumenty są identyczne - brak działań wymaganych.")
-        else:
-            report.append(f"⚠️ Wykryto różnice na {pages_with_differences} stronach:")
-            if critical_pages:
-                report.append(f"  🔴 Priorytet KRYTYCZNY: Strony {[p.page_number for p in critical_pages]}")
-            if moderate_pages:
-                report.append(f"  🟡 Priorytet ŚREDNI: Strony {[p.page_number for p in moderate_pages]}")
-            if minor_pages:
-                report.append(f"  🟢 Priorytet NISKI: Strony {[p.page_number for p in minor_pages]}")
-            
-            report.append(f"\n📸 WIZUALIZACJE:")
-            report.append(f"  Sprawdź folder 'highlighted_diffs/' - zawiera obrazy z podświetlonymi różnicami")
-            report.append(f"  Czerwone obszary = wykryte różnice")
+        for writer in writers:
+            print(f"\n📄 Hybrydowy raport zapisany: {writer.output_file}")
         
-        report.append("")
-        report.append("=" * 80)
-        report.append("KONIEC HYBRYDOWEGO RAPORTU")
-        report.append("=" * 80)
-        
-        return "\n".join(report)
+        # Zamknij wpis w historii wyników
+        self.results_store.finish_comparison(comparison_id, output_file, self.comparator.last_alignment)
+        if self.artifacts_dir:
+            self._drop_unused_rasters(results)
+            self._prune_artifacts()
+        return output_file, results
+    
+    def _drop_unused_rasters(self, results):
+        """
+        Usuwa pełne rastry po zapisaniu wyników - zostają podglądy i rastry PDF1 stron z różnicami
+        (potrzebne do pełnego podglądu generowanego na żądanie)
+        """
+        needed = {os.path.abspath(result.source_image_path) for result in results
+                  if result.diff_mask is not None and result.source_image_path}
+        dropped = []
+        for folder in ("temp_pdf1", "temp_pdf2"):
+            folder = os.path.join(self.comparator.work_dir, folder)
+            if not os.path.isdir(folder):
+                continue
+            for filename in os.listdir(folder):
+                path = os.path.join(folder, filename)
+                if os.path.abspath(path) not in needed:
+                    os.remove(path)
+                    dropped.append(path)
+        # Metadane usuniętych stron nie są już potrzebne
+        self.comparator.processor.release_pages(dropped)
+        self.comparator.extractor.timed_out.difference_update(dropped)
+    
+    def _prune_artifacts(self):
+        """
+        Usuwa katalogi plików starszych porównań (wyniki zostają w bazie)
+        """
+        comparison_ids = sorted(
+            (int(name.split("_", 1)[1]) for name in os.listdir(self.artifacts_dir)
+             if name.startswith("comparison_") and name.split("_", 1)[1].isdigit()),
+            reverse=True
+        )
+        for comparison_id in comparison_ids[self.keep_artifacts:]:
+            shutil.rmtree(self._comparison_dir(comparison_id), ignore_errors=True)
 
 # Test generatora
 if __name__ == "__main__":
@@ -0,0 +1,126 @@
+import numpy as np
+from PIL import Image, ImageDraw
+from dataclasses import dataclass, asdict
+from typing import Optional, Tuple
+import hashlib
+import json
+
+@dataclass(frozen=True)
+class IgnoreRegion:
+    """Obszar pomijany przy porównaniu - współrzędne względne strony (0-1)"""
+    x: float
+    y: float
+    width: float
+    height: float
+    label: str = ""
+    pages: Optional[Tuple[int, ...]] = None  # None = wszystkie strony
+
+    def applies_to(self, page_number):
+        return self.pages is None or page_number is None or page_number in self.pages
+
+    def to_pixels(self, page_height, page_width):
+        """
+        Prostokąt w pikselach: (x0, y0, x1, y1), przycięty do strony
+        """
+        x0 = max(0, int(self.x * page_width))
+        y0 = max(0, int(self.y * page_height))
+        x1 = min(page_width, int(round((self.x + self.width) * page_width)))
+        y1 = min(page_height, int(round((self.y + self.height) * page_height)))
+        return x0, y0, x1, y1
+
+class IgnoreTemplate:
+    """
+    Zestaw obszarów ignorowanych (znaczniki czasu druku, numery zleceń, stopki, kody kreskowe).
+    Maski kompilowane są raz na rozmiar strony - szablon można używać dla całej serii zadań.
+    """
+
+    def __init__(self, regions=(), name=""):
+        self.name = name
+        self.regions = tuple(regions)
+        self._masks = {}
+
+    def __bool__(self):
+        return bool(self.regions)
+
+    def _regions_for_page(self, page_number):
+        return tuple(i for i, region in enumerate(self.regions) if region.applies_to(page_number))
+
+    def keep_mask(self, height, width, page_number=None):
+        """
+        Maska uint8 (255 = porównuj, 0 = ignoruj) oraz liczba porównywanych pikseli.
+        Wynik jest buforowany - nie wolno go modyfikować.
+        """
+        applicable = self._regions_for_page(page_number)
+        key = (height, width, applicable)
+        if key not in self._masks:
+            mask = np.full((height, width), 255, dtype=np.uint8)
+            for index in applicable:
+                x0, y0, x1, y1 = self.regions[index].to_pixels(height, width)
+                mask[y0:y1, x0:x1] = 0
+            mask.setflags(write=False)
+            self._masks[key] = (mask, int(np.count_nonzero(mask)))
+        return self._masks[key]
+
+    def keep_mask_tile(self, height, width, x, y, tile_width, tile_height, page_number=None):
+        """
+        Maska wycinka strony height x width - bez alokowania maski całej (dużej) strony
+        """
+        mask = np.full((tile_height, tile_width), 255, dtype=np.uint8)
+        for index in self._regions_for_page(page_number):
+            x0, y0, x1, y1 = self.regions[index].to_pixels(height, width)
+            x0, x1 = max(x0, x) - x, min(x1, x + tile_width) - x
+            y0, y1 = max(y0, y) - y, min(y1, y + tile_height) - y
+            if x1 > x0 and y1 > y0:
+                mask[y0:y1, x0:x1] = 0
+        return mask, int(np.count_nonzero(mask))
+    
+    def apply_to_image(self, image: Image.Image, page_number=None) -> Image.Image:
+        """
+        Zamalowuje obszary ignorowane na biało (OCR nie widzi w nich tekstu)
+        """
+        applicable = self._regions_for_page(page_number)
+        if not applicable:
+            return image
+
+        image = image.convert('RGB')
+        draw = ImageDraw.Draw(image)
+        width, height = image.size
+        for index in applicable:
+            x0, y0, x1, y1 = self.regions[index].to_pixels(height, width)
+            if x1 > x0 and y1 > y0:
+                draw.rectangle([x0, y0, x1 - 1, y1 - 1], fill='white')
+        return image
+
+    def key(self) -> str:
+        """
+        Krótki identyfikator zawartości szablonu (np. do klucza ustawień w magazynie wyników)
+        """
+        payload = json.dumps([asdict(region) for region in self.regions], sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+    def to_dict(self):
+        return {'name': self.name, 'regions': [asdict(region) for region in self.regions]}
+
+    @classmethod
+    def from_dict(cls, data):
+        regions = []
+        for region in data.get('regions', []):
+            region = dict(region)
+            if region.get('pages') is not None:
+                region['pages'] = tuple(region['pages'])
+            regions.append(IgnoreRegion(**region))
+        return cls(regions, data.get('name', ""))
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+# Test modułu
+if __name__ == "__main__":
+    template = IgnoreTemplate([IgnoreRegion(0.0, 0.95, 1.0, 0.05, "stopka")], "przykład")
+    print(f"Ignore Template gotowy! ({template.key()})")
@@ -0,0 +1,107 @@
+from hybrid_comparator import HybridComparisonResult, result_severity, result_to_dict
+from typing import Iterator, List
+import io
+import json
+import os
+import zipfile
+
+CHUNK_SIZE = 1024 * 1024
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Niewyszukiwalny strumień dla ZipFile - zebrane bajty są oddawane i zwalniane przez drain()
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer.extend(data)
+        return len(data)
+
+    def drain(self):
+        if self._buffer:
+            chunk = bytes(self._buffer)
+            self._buffer.clear()
+            yield chunk
+
+def job_report_files(report_file: str) -> List[str]:
+    """
+    Raport główny i raporty w innych formatach zapisane obok (ta sama nazwa bazowa)
+    """
+    base_name = os.path.splitext(report_file)[0]
+    files = [report_file]
+    for ext in ('.txt', '.jsonl'):
+        candidate = base_name + ext
+        if candidate != report_file and os.path.exists(candidate):
+            files.append(candidate)
+    return files
+
+def job_summary(results: List[HybridComparisonResult], report_file: str = None) -> dict:
+    """
+    Podsumowanie JSON zadania - bez pełnych różnic tekstowych (są w raporcie)
+    """
+    pages = []
+    for result in results:
+        page = result_to_dict(result)
+        page['text_differences_count'] = len(page.pop('text_differences'))
+        page['severity'] = result_severity(result)
+        pages.append(page)
+
+    return {
+        'report_file': os.path.basename(report_file) if report_file else None,
+        'page_count': len(results),
+        'pages_with_differences': sum(1 for r in results if r.overall_similarity < 1.0),
+        'pages': pages,
+    }
+
+def _job_entries(report_file, results):
+    """
+    Pliki należące tylko do tego zadania: (nazwa w archiwum, ścieżka)
+    """
+    if report_file:
+        for path in job_report_files(report_file):
+            if os.path.exists(path):
+                yield os.path.basename(path), path
+
+    for result in results:
+        for path in (result.thumbnail_path, result.highlighted_diff_path):
+            if path and os.path.exists(path):
+                yield f"pages/{os.path.basename(path)}", path
+
+def iter_job_archive(results: List[HybridComparisonResult], report_file: str = None,
+                     chunk_size=CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Archiwum ZIP zadania generowane kawałkami (bez kompresji - PNG/WebP już są skompresowane).
+    W pamięci jest najwyżej jeden kawałek naraz.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, path in _job_entries(report_file, results):
+            with open(path, 'rb') as source, archive.open(arcname, 'w', force_zip64=True) as target:
+                for chunk in iter(lambda: source.read(chunk_size), b''):
+                    target.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+
+        summary = json.dumps(job_summary(results, report_file), ensure_ascii=False, indent=2)
+        archive.writestr('summary.json', summary)
+        yield from sink.drain()
+
+    # Katalog centralny zapisywany przy zamknięciu archiwum
+    yield from sink.drain()
+
+def write_job_archive(output_path: str, results: List[HybridComparisonResult],
+                      report_file: str = None, chunk_size=CHUNK_SIZE) -> str:
+    """
+    Zapisuje archiwum zadania na dysk strumieniowo
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, 'wb') as f:
+        for chunk in iter_job_archive(results, report_file, chunk_size):
+            f.write(chunk)
+    return output_path
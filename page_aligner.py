@@ -0,0 +1,157 @@
+from fingerprints import perceptual_hash, hash_similarity, text_shingles, jaccard_similarity
+from dataclasses import dataclass
+from typing import List, Optional, Set
+
+@dataclass
+class PageFingerprint:
+    """Odcisk strony używany do dopasowania"""
+    page_number: int
+    image_hash: int
+    shingles: Set[int]
+
+@dataclass
+class PageMatch:
+    """Para stron po dopasowaniu (None = brak odpowiednika)"""
+    page1: Optional[int]
+    page2: Optional[int]
+    status: str  # 'matched', 'moved', 'changed', 'inserted', 'deleted'
+    similarity: float = 0.0
+
+class PageAligner:
+    def __init__(self, min_similarity=0.5, visual_weight=0.5, min_changed_similarity=None):
+        """
+        min_similarity - poniżej tego progu strony nie są parowane
+        visual_weight - waga hasha obrazu (reszta to shingle tekstu)
+        min_changed_similarity - niższy próg dla stron w tej samej luce dopasowania (strona przepisana);
+                                 domyślnie min_similarity / 2
+        """
+        self.min_similarity = min_similarity
+        self.visual_weight = visual_weight
+        self.min_changed_similarity = (min_changed_similarity if min_changed_similarity is not None
+                                       else min_similarity / 2)
+
+    def fingerprint_pages(self, image_paths, texts) -> List[PageFingerprint]:
+        """
+        Liczy odciski wszystkich stron (texts - lista tekstów OCR w kolejności stron)
+        """
+        return [
+            PageFingerprint(
+                page_number=i + 1,
+                image_hash=perceptual_hash(image_path),
+                shingles=text_shingles(text)
+            )
+            for i, (image_path, text) in enumerate(zip(image_paths, texts))
+        ]
+
+    def page_similarity(self, fp1: PageFingerprint, fp2: PageFingerprint) -> float:
+        visual = hash_similarity(fp1.image_hash, fp2.image_hash)
+        text = jaccard_similarity(fp1.shingles, fp2.shingles)
+        return self.visual_weight * visual + (1 - self.visual_weight) * text
+
+    def align(self, fingerprints1: List[PageFingerprint],
+              fingerprints2: List[PageFingerprint]) -> List[PageMatch]:
+        """
+        Dopasowanie globalne (Needleman-Wunsch) + parowanie przestawionych i mocno zmienionych stron
+        """
+        n, m = len(fingerprints1), len(fingerprints2)
+        similarity = [
+            [self.page_similarity(fp1, fp2) for fp2 in fingerprints2]
+            for fp1 in fingerprints1
+        ]
+
+        # Zysk z pary = podobieństwo ponad próg, przerwa kosztuje 0.
+        # Dzięki temu słabo podobne strony wolą zostać wstawione/usunięte.
+        score = [[0.0] * (m + 1) for _ in range(n + 1)]
+        for i in range(1, n + 1):
+            for j in range(1, m + 1):
+                score[i][j] = max(
+                    score[i - 1][j - 1] + similarity[i - 1][j - 1] - self.min_similarity,
+                    score[i - 1][j],
+                    score[i][j - 1]
+                )
+
+        # Odtworzenie ścieżki
+        matches = []
+        i, j = n, m
+        while i > 0 or j > 0:
+            if i > 0 and j > 0 and score[i][j] == score[i - 1][j - 1] + similarity[i - 1][j - 1] - self.min_similarity \
+                    and similarity[i - 1][j - 1] >= self.min_similarity:
+                matches.append(PageMatch(i, j, 'matched', similarity[i - 1][j - 1]))
+                i, j = i - 1, j - 1
+            elif i > 0 and (j == 0 or score[i][j] == score[i - 1][j]):
+                matches.append(PageMatch(i, None, 'deleted'))
+                i -= 1
+            else:
+                matches.append(PageMatch(None, j, 'inserted'))
+                j -= 1
+        matches.reverse()
+
+        return self._pair_changed_pages(self._pair_moved_pages(matches, similarity), similarity)
+
+    def _pair_moved_pages(self, matches, similarity):
+        """
+        Usunięta strona podobna do dodanej = strona przestawiona
+        """
+        deleted = [match for match in matches if match.status == 'deleted']
+        inserted = [match for match in matches if match.status == 'inserted']
+
+        candidates = sorted(
+            (
+                (similarity[d.page1 - 1][a.page2 - 1], d, a)
+                for d in deleted for a in inserted
+                if similarity[d.page1 - 1][a.page2 - 1] >= self.min_similarity
+            ),
+            key=lambda candidate: candidate[0],
+            reverse=True
+        )
+
+        paired = set()
+        for score, deleted_match, inserted_match in candidates:
+            if id(deleted_match) in paired or id(inserted_match) in paired:
+                continue
+            paired.update((id(deleted_match), id(inserted_match)))
+            # Strona trafia w miejsce, na którym pojawia się w PDF2
+            inserted_match.page1 = deleted_match.page1
+            inserted_match.status = 'moved'
+            inserted_match.similarity = score
+
+        return [
+            match for match in matches
+            if not (match.status == 'deleted' and id(match) in paired)
+        ]
+
+    def _pair_changed_pages(self, matches, similarity):
+        """
+        Usunięta i dodana strona w tej samej luce dopasowania = ta sama strona, mocno zmieniona
+        (np. przepisany tekst przy niezmienionym układzie) - parowane 1:1 w kolejności, o ile podobieństwo
+        sięga min_changed_similarity; niepowiązane strony zostają usunięte/dodane
+        """
+        result = []
+        gap = []
+        for match in matches + [None]:
+            if match is not None and match.status in ('deleted', 'inserted'):
+                gap.append(match)
+                continue
+
+            deleted = [m for m in gap if m.status == 'deleted']
+            inserted = [m for m in gap if m.status == 'inserted']
+            unpaired_deleted, unpaired_inserted = deleted[len(inserted):], inserted[len(deleted):]
+            for deleted_match, inserted_match in zip(deleted, inserted):
+                score = similarity[deleted_match.page1 - 1][inserted_match.page2 - 1]
+                if score >= self.min_changed_similarity:
+                    result.append(PageMatch(deleted_match.page1, inserted_match.page2, 'changed', score))
+                else:
+                    unpaired_deleted.append(deleted_match)
+                    unpaired_inserted.append(inserted_match)
+            result.extend(sorted(unpaired_deleted, key=lambda m: m.page1)
+                          + sorted(unpaired_inserted, key=lambda m: m.page2))
+            gap = []
+
+            if match is not None:
+                result.append(match)
+        return result
+
+# Test modułu
+if __name__ == "__main__":
+    aligner = PageAligner()
+    print("Page Aligner gotowy!")
@@ -0,0 +1,36 @@
+from dataclasses import dataclass
+
+# Flagi degradacji strony (HybridComparisonResult.degradation)
+DEGRADED_RENDER_LOW_DPI = 'render_low_dpi'
+DEGRADED_RENDER_SKIPPED = 'render_skipped'
+DEGRADED_OCR_TIMEOUT = 'ocr_timeout'
+DEGRADED_DIFF_DOWNSCALED = 'diff_downscaled'
+
+DEGRADATION_LABELS = {
+    DEGRADED_RENDER_LOW_DPI: "render w niższej rozdzielczości",
+    DEGRADED_RENDER_SKIPPED: "strona pominięta (limit czasu renderowania)",
+    DEGRADED_OCR_TIMEOUT: "tylko analiza wizualna (limit czasu OCR)",
+    DEGRADED_DIFF_DOWNSCALED: "diff na pomniejszonym obrazie",
+}
+
+@dataclass
+class PageBudget:
+    """
+    Limity na jedną stronę. Po przekroczeniu strona przechodzi w tańszy tryb
+    zamiast blokować całe porównanie. None = bez limitu.
+    """
+    render_seconds: float = 120      # poppler, na stronę
+    ocr_seconds: float = 60          # Tesseract, na stronę
+    diff_pixels: int = 40_000_000    # powyżej - render i diff kafelkami (albo diff na pomniejszonym obrazie)
+    tile_size: int = 4096            # bok kafelka w pikselach pełnego DPI
+    fallback_dpi: int = 72           # ponowny render po przekroczeniu limitu czasu
+
+def degradation_labels(degradation) -> str:
+    """
+    Opis flag degradacji do raportu
+    """
+    return ", ".join(DEGRADATION_LABELS.get(flag, flag) for flag in degradation or [])
+
+# Test modułu
+if __name__ == "__main__":
+    print(f"Page Budget gotowy! ({PageBudget()})")
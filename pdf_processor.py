@@ -1,49 +1,396 @@
 import pdf2image
+from pdf2image.exceptions import PDFPopplerTimeoutError
 from PIL import Image
+from page_budget import PageBudget, DEGRADED_RENDER_LOW_DPI, DEGRADED_RENDER_SKIPPED
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import cv2
+import math
+import numpy as np
 import os
+import subprocess
+import threading
+import time
+import uuid
+
+# Dostępne kombinacje backend/format: nazwa -> (use_pdftocairo, fmt)
+# pdftocairo nie zapisuje PPM, więc dla niego sprawdzamy tylko PNG
+RENDER_BACKENDS = {
+    'pdftoppm-ppm': (False, 'ppm'),
+    'pdftoppm-png': (False, 'png'),
+    'pdftocairo-png': (True, 'png'),
+}
+# Backend bez pomiaru - gdy strona próbna przekracza limit czasu
+DEFAULT_RENDER_BACKEND = 'pdftoppm-ppm'
+
+@dataclass(frozen=True)
+class TiledPage:
+    """
+    Strona większa niż limit pikseli - porównywana kafelkami w pełnym DPI.
+    Na dysku leży tylko podgląd w DPI / factor (OCR, miniatury, dopasowanie stron).
+    """
+    pdf_path: str
+    page_number: int
+    dpi: float
+    width: int   # piksele w pełnym DPI
+    height: int
+    factor: int
 
 class PDFProcessor:
-    def __init__(self, dpi=200):
+    def __init__(self, dpi=200, workers=None, backend='auto', budget: PageBudget = None):
         """
         dpi - jakość konwersji (200 to dobry balans jakość/rozmiar)
+        workers - liczba równoległych procesów poppler (domyślnie liczba CPU)
+        backend - 'auto' (pomiar przy pierwszym użyciu) lub klucz z RENDER_BACKENDS
+        budget - limity czasu na stronę; None = bez limitów
         """
+        if backend != 'auto' and backend not in RENDER_BACKENDS:
+            raise ValueError(f"Nieznany backend renderowania: {backend}")
+
         self.dpi = dpi
-    
-    def pdf_to_images(self, pdf_path, output_folder=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.backend = backend
+        self.budget = budget
+        # Strony wyrenderowane w trybie uproszczonym: ścieżka obrazu -> flaga degradacji
+        self.degraded_pages = {}
+        # Duże strony z podglądem na dysku: ścieżka podglądu -> TiledPage
+        self.tiled_pages = {}
+        # Pula procesów poppler - tworzona raz i współdzielona między zadaniami
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="render")
+            return self._executor
+
+    def close(self):
         """
-        Konwertuje PDF na obrazy
+        Zamyka pulę renderowania (np. przy zatrzymaniu usługi)
+        """
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def release_pages(self, image_paths):
+        """
+        Zapomina metadane stron (degradacja, podglądy dużych stron) po usunięciu plików zadania
+        """
+        for image_path in image_paths:
+            self.degraded_pages.pop(image_path, None)
+            self.tiled_pages.pop(image_path, None)
+
+    def get_page_count(self, pdf_path):
+        """
+        Zwraca liczbę stron PDF (pdfinfo, bez renderowania)
         """
         if not os.path.exists(pdf_path):
             raise FileNotFoundError(f"Nie znaleziono pliku: {pdf_path}")
-        
-        # Stwórz folder na obrazy jeśli nie istnieje
+
+        return int(pdf2image.pdfinfo_from_path(pdf_path)["Pages"])
+
+    def get_page_sizes(self, pdf_path, first_page, last_page):
+        """
+        Rozmiary stron w punktach (szerokość, wysokość) po uwzględnieniu obrotu - bez renderowania
+        """
+        info = pdf2image.pdfinfo_from_path(pdf_path, first_page=first_page, last_page=last_page)
+
+        sizes = {}
+        for page_number in range(first_page, last_page + 1):
+            # pdfinfo -f/-l: "Page    N size: 612 x 792 pts (letter)", "Page    N rot: 90"
+            size = info.get(f"Page {page_number:>4} size") or info.get("Page size")
+            if size is None:
+                continue
+            width, _, height = size.split()[:3]
+            width, height = float(width), float(height)
+            if int(float(info.get(f"Page {page_number:>4} rot", 0))) % 180:
+                width, height = height, width
+            sizes[page_number] = (width, height)
+        return sizes
+
+    def _large_pages(self, pdf_path, first_page, last_page):
+        """
+        Strony, których raster w pełnym DPI przekracza limit pikseli: numer -> TiledPage
+        """
+        if self.budget is None or not self.budget.diff_pixels:
+            return {}
+
+        large = {}
+        for page_number, (width_pts, height_pts) in self.get_page_sizes(pdf_path, first_page, last_page).items():
+            width = math.ceil(width_pts * self.dpi / 72)
+            height = math.ceil(height_pts * self.dpi / 72)
+            factor = 1
+            while math.ceil(width / factor) * math.ceil(height / factor) > self.budget.diff_pixels:
+                factor += 1
+            if factor > 1:
+                large[page_number] = TiledPage(pdf_path, page_number, self.dpi, width, height, factor)
+        return large
+
+    def _page_tasks(self, pdf_path, first_page, last_page, large):
+        """
+        Dzieli zakres na podzakresy zwykłych stron i pojedyncze duże strony: (first, last, TiledPage)
+        """
+        tasks = []
+        start = first_page
+        for page_number in range(first_page, last_page + 1):
+            if page_number in large:
+                if start < page_number:
+                    tasks.append((start, page_number - 1, None))
+                tasks.append((page_number, page_number, large[page_number]))
+                start = page_number + 1
+        if start <= last_page:
+            tasks.append((start, last_page, None))
+        return tasks
+
+    def select_backend(self, pdf_path):
+        """
+        Wybiera najszybszą kombinację backend/format mierząc render pierwszej strony
+        (strona wielkoformatowa - w DPI podglądu, tak jak jest potem renderowana)
+        """
+        if self.backend != 'auto':
+            return self.backend
+
+        tiled = self._large_pages(pdf_path, 1, 1).get(1)
+        probe_dpi = tiled.dpi / tiled.factor if tiled else None
+
+        timings = {}
+        probe_folder = os.path.join("temp_images", f"probe_{uuid.uuid4().hex}")
+        os.makedirs(probe_folder, exist_ok=True)
+
+        try:
+            for name in RENDER_BACKENDS:
+                start = time.perf_counter()
+                try:
+                    self._render_range(pdf_path, 1, 1, probe_folder, name,
+                                       dpi=probe_dpi, timeout=self._render_timeout(1))
+                    timings[name] = time.perf_counter() - start
+                except PDFPopplerTimeoutError:
+                    # Strona próbna jest patologiczna - kolejne pomiary tylko zmarnowałyby limit czasu
+                    timings = None
+                    break
+        finally:
+            for filename in os.listdir(probe_folder):
+                os.remove(os.path.join(probe_folder, filename))
+            os.rmdir(probe_folder)
+
+        if timings is None:
+            self.backend = DEFAULT_RENDER_BACKEND
+            print(f"⏱️ Limit czasu pomiaru backendu - używam {self.backend}")
+            return self.backend
+
+        # Zapamiętaj wybór - kolejne dokumenty renderujemy tym samym backendem
+        self.backend = min(timings, key=timings.get)
+        print(f"⚙️ Wybrany backend renderowania: {self.backend} "
+              f"({', '.join(f'{k}={v:.2f}s' for k, v in timings.items())})")
+        return self.backend
+
+    def pdf_to_images(self, pdf_path, output_folder=None):
+        """
+        Konwertuje PDF na obrazy
+        """
         if output_folder is None:
             output_folder = "temp_images"
-        
+
+        return self.render_documents([(pdf_path, output_folder)])[0]
+
+    def render_documents(self, documents):
+        """
+        Renderuje kilka PDF-ów jednocześnie.
+        documents - lista (pdf_path, output_folder); zwraca listę list ścieżek obrazów
+        """
+        # Liczba stron ustalana z góry, żeby równo podzielić pracę
+        page_counts = []
+        for pdf_path, output_folder in documents:
+            page_counts.append(self.get_page_count(pdf_path))
+            os.makedirs(output_folder, exist_ok=True)
+
+        backend = self.select_backend(documents[0][0]) if documents else self.backend
+
+        # Każdy dokument dostaje część workerów proporcjonalną do liczby stron
+        total_pages = sum(page_counts) or 1
+        tasks = []
+        for doc_index, ((pdf_path, output_folder), page_count) in enumerate(zip(documents, page_counts)):
+            print(f"📄 Konwertuję PDF: {pdf_path} ({page_count} stron)")
+            large = self._large_pages(pdf_path, 1, page_count) if page_count else {}
+            if large:
+                print(f"🧱 Strony wielkoformatowe (porównanie kafelkami): {sorted(large)}")
+            shard_count = max(1, round(self.workers * page_count / total_pages))
+            for first_page, last_page in self._shard_ranges(page_count, shard_count):
+                for task in self._page_tasks(pdf_path, first_page, last_page, large):
+                    tasks.append((doc_index, pdf_path, output_folder) + task)
+
+        image_paths = [[None] * count for count in page_counts]
+
+        executor = self._get_executor()
+        futures = [
+            (doc_index, first_page, executor.submit(
+                self._render_task, pdf_path, first_page, last_page, output_folder, backend, tiled
+            ))
+            for doc_index, pdf_path, output_folder, first_page, last_page, tiled in tasks
+        ]
+        for doc_index, first_page, future in futures:
+            for offset, image_path in enumerate(future.result()):
+                image_paths[doc_index][first_page - 1 + offset] = image_path
+
+        for (pdf_path, _), paths in zip(documents, image_paths):
+            print(f"🎉 Konwersja zakończona! {pdf_path}: {len(paths)} stron")
+
+        return image_paths
+
+    def render_pages(self, pdf_path, first_page, last_page, output_folder):
+        """
+        Renderuje zakres stron (numeracja od 1, włącznie) jednym procesem poppler
+        """
         os.makedirs(output_folder, exist_ok=True)
-        
-        print(f"📄 Konwertuję PDF: {pdf_path}")
-        
-        # Konwersja PDF → obrazy
-        images = pdf2image.convert_from_path(
-            pdf_path, 
-            dpi=self.dpi,
-            fmt='PNG'
-        )
-        
+        backend = self.select_backend(pdf_path)
+
         image_paths = []
-        
-        for i, image in enumerate(images):
-            image_path = os.path.join(output_folder, f"page_{i+1}.png")
-            image.save(image_path, 'PNG')
+        large = self._large_pages(pdf_path, first_page, last_page)
+        for task_first, task_last, tiled in self._page_tasks(pdf_path, first_page, last_page, large):
+            image_paths.extend(
+                self._render_task(pdf_path, task_first, task_last, output_folder, backend, tiled)
+            )
+        return image_paths
+
+    def _render_task(self, pdf_path, first_page, last_page, output_folder, backend, tiled=None):
+        """
+        Zwykły zakres stron albo podgląd dużej strony (DPI / factor) zapamiętany w tiled_pages
+        """
+        if tiled is None:
+            return self._render_with_budget(pdf_path, first_page, last_page, output_folder, backend)
+
+        image_paths = self._render_with_budget(pdf_path, first_page, last_page, output_folder, backend,
+                                               dpi=tiled.dpi / tiled.factor)
+        if image_paths[0] not in self.degraded_pages:
+            self.tiled_pages[image_paths[0]] = tiled
+        return image_paths
+
+    def render_tile(self, page: TiledPage, x, y, width, height):
+        """
+        Wycinek strony w pełnym DPI (opcje crop pdftoppm: -x -y -W -H), prosto do pamięci.
+        pdf2image nie obsługuje wycinków, więc pdftoppm wywoływany jest bezpośrednio.
+        """
+        command = [
+            'pdftoppm', '-r', str(page.dpi),
+            '-f', str(page.page_number), '-l', str(page.page_number),
+            '-x', str(x), '-y', str(y), '-W', str(width), '-H', str(height),
+            '-singlefile', page.pdf_path
+        ]
+        # Bez prefiksu wyjścia pdftoppm zapisuje PPM na stdout
+        output = subprocess.run(
+            command, capture_output=True, check=True, timeout=self._render_timeout(1)
+        ).stdout
+        tile = cv2.imdecode(np.frombuffer(output, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if tile is None:
+            raise ValueError(f"Nie można zdekodować kafelka strony {page.page_number} ({x}, {y})")
+        return tile
+
+    def _render_timeout(self, page_count):
+        if self.budget is None or not self.budget.render_seconds:
+            return None
+        return self.budget.render_seconds * page_count
+
+    def _render_with_budget(self, pdf_path, first_page, last_page, output_folder, backend, dpi=None):
+        """
+        Render zakresu z limitem czasu. Po przekroczeniu: zakres strona po stronie,
+        potem pojedyncza strona w fallback_dpi, a na końcu pusta strona z flagą pominięcia.
+        """
+        timeout = self._render_timeout(last_page - first_page + 1)
+        try:
+            return self._render_range(pdf_path, first_page, last_page, output_folder, backend,
+                                      dpi=dpi, timeout=timeout)
+        except PDFPopplerTimeoutError:
+            pass
+
+        if last_page > first_page:
+            print(f"⏱️ Limit czasu renderowania stron {first_page}-{last_page} - renderuję pojedynczo")
+            image_paths = []
+            for page_number in range(first_page, last_page + 1):
+                image_paths.extend(
+                    self._render_with_budget(pdf_path, page_number, page_number, output_folder, backend, dpi)
+                )
+            return image_paths
+
+        fallback_dpi = min(self.budget.fallback_dpi, dpi or self.dpi)
+        print(f"⏱️ Limit czasu renderowania strony {first_page} - ponawiam w {fallback_dpi} DPI")
+        try:
+            image_paths = self._render_range(pdf_path, first_page, first_page, output_folder, backend,
+                                             dpi=fallback_dpi, timeout=timeout)
+            self.degraded_pages[image_paths[0]] = DEGRADED_RENDER_LOW_DPI
+            return image_paths
+        except PDFPopplerTimeoutError:
+            pass
+
+        # Pusta strona zastępcza - porównanie idzie dalej, strona jest oznaczona jako pominięta
+        print(f"⚠️ Strona {first_page} pominięta - przekroczony limit czasu renderowania")
+        _, fmt = RENDER_BACKENDS[backend]
+        image_path = os.path.join(output_folder, f"page_{first_page}.{fmt}")
+        Image.new('RGB', (1, 1), 'white').save(image_path)
+        self.degraded_pages[image_path] = DEGRADED_RENDER_SKIPPED
+        return [image_path]
+
+    def _render_range(self, pdf_path, first_page, last_page, output_folder, backend,
+                      dpi=None, timeout=None):
+        """
+        Renderuje zakres stron prosto do plików page_N.<fmt> (bez konwersji przez PIL)
+        """
+        use_pdftocairo, fmt = RENDER_BACKENDS[backend]
+        prefix = f"shard_{uuid.uuid4().hex}_"
+
+        try:
+            rendered = pdf2image.convert_from_path(
+                pdf_path,
+                dpi=dpi or self.dpi,
+                first_page=first_page,
+                last_page=last_page,
+                fmt=fmt,
+                use_pdftocairo=use_pdftocairo,
+                output_folder=output_folder,
+                output_file=prefix,
+                paths_only=True,
+                timeout=timeout
+            )
+        except PDFPopplerTimeoutError:
+            # Usuń częściowo zapisane strony przerwanego procesu
+            for filename in os.listdir(output_folder):
+                if filename.startswith(prefix):
+                    os.remove(os.path.join(output_folder, filename))
+            raise
+
+        image_paths = []
+
+        # Poppler numeruje pliki z zerami wiodącymi, więc sortowanie zachowuje kolejność stron
+        for page_number, rendered_path in zip(range(first_page, last_page + 1), rendered):
+            image_path = os.path.join(output_folder, f"page_{page_number}.{fmt}")
+            os.replace(rendered_path, image_path)
+            self.degraded_pages.pop(image_path, None)
+            self.tiled_pages.pop(image_path, None)
             image_paths.append(image_path)
-            print(f"✅ Strona {i+1} → {image_path}")
-        
-        print(f"🎉 Konwersja zakończona! {len(images)} stron")
+            print(f"✅ Strona {page_number} → {image_path}")
+
         return image_paths
 
+    @staticmethod
+    def _shard_ranges(page_count, shard_count):
+        """
+        Dzieli strony 1..page_count na shard_count ciągłych, równych zakresów
+        """
+        shard_count = max(1, min(shard_count, page_count))
+        base, remainder = divmod(page_count, shard_count)
+
+        ranges = []
+        first_page = 1
+        for shard in range(shard_count):
+            size = base + (1 if shard < remainder else 0)
+            ranges.append((first_page, first_page + size - 1))
+            first_page += size
+
+        return ranges
+
 # Test modułu
 if __name__ == "__main__":
     processor = PDFProcessor()
     print("PDF Processor gotowy do testów!")
-    print("Aby przetestować, umieść plik PDF w folderze projektu")
\ No newline at end of file
+    print("Aby przetestować, umieść plik PDF w folderze projektu")
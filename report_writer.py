@@ -0,0 +1,283 @@
+from hybrid_comparator import HybridComparisonResult, result_severity, result_to_dict
+from page_aligner import PageMatch
+from page_budget import degradation_labels
+from dataclasses import asdict
+from datetime import datetime
+from typing import List
+import json
+import os
+
+# Etykiety klas różnic w raporcie
+SEVERITY_LABELS = {
+    'critical': "🔴 KRYTYCZNA",
+    'moderate': "🟡 ŚREDNIA",
+    'minor': "🟢 DROBNA",
+    'identical': "✅ IDENTYCZNA",
+}
+
+class ReportStats:
+    """Bieżące agregaty raportu - bez trzymania wyników stron w pamięci"""
+
+    def __init__(self):
+        self.page_count = 0
+        self.sum_overall = 0.0
+        self.sum_visual = 0.0
+        self.sum_text = 0.0
+        self.text_page_count = 0  # strony z wynikiem OCR (bez stron po limicie czasu OCR)
+        self.pages_by_severity = {severity: [] for severity in SEVERITY_LABELS}
+        self.degraded_pages = []
+
+    def add(self, result: HybridComparisonResult):
+        self.page_count += 1
+        self.sum_overall += result.overall_similarity
+        self.sum_visual += result.visual_similarity_score
+        if result.text_similarity_score is not None:
+            self.sum_text += result.text_similarity_score
+            self.text_page_count += 1
+        self.pages_by_severity[result_severity(result)].append(result.page_number)
+        if result.degraded:
+            self.degraded_pages.append(result.page_number)
+
+    @property
+    def pages_with_differences(self):
+        return self.page_count - len(self.pages_by_severity['identical'])
+
+    def average(self, total, count=None):
+        count = self.page_count if count is None else count
+        return total / count if count else 0
+
+    def to_dict(self):
+        return {
+            'page_count': self.page_count,
+            'pages_with_differences': self.pages_with_differences,
+            'avg_overall_similarity': self.average(self.sum_overall),
+            'avg_visual_similarity': self.average(self.sum_visual),
+            'avg_text_similarity': self.average(self.sum_text, self.text_page_count),
+            'pages_by_severity': self.pages_by_severity,
+            'degraded_page_count': len(self.degraded_pages),
+            'degraded_pages': self.degraded_pages,
+        }
+
+class ReportWriter:
+    """
+    Wspólna część formatów raportu: plik wyjściowy, statystyki i zamykanie
+    Podklasy implementują write_header, write_page i write_summary.
+    """
+
+    def __init__(self, output_file: str, pdf1_path: str, pdf2_path: str, artifacts_dir: str = None):
+        """
+        artifacts_dir - katalog podglądów tego porównania (podawany w raporcie)
+        """
+        self.output_file = output_file
+        self.pdf1_path = pdf1_path
+        self.pdf2_path = pdf2_path
+        self.artifacts_dir = artifacts_dir
+        self.stats = ReportStats()
+        self._file = open(output_file, 'w', encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+class TextReportWriter(ReportWriter):
+    """
+    Raport tekstowy (PL) zapisywany na dysk strona po stronie.
+    Podsumowanie trafia na koniec pliku - znane jest dopiero po ostatniej stronie.
+    """
+
+    def _line(self, text=""):
+        self._file.write(text + "\n")
+
+    def write_header(self):
+        self._line("=" * 80)
+        self._line("HYBRYDOWY RAPORT PORÓWNANIA PDF (OCR + COMPUTER VISION)")
+        self._line("=" * 80)
+        self._line(f"Data analizy: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        self._line(f"PDF 1: {self.pdf1_path}")
+        self._line(f"PDF 2: {self.pdf2_path}")
+        self._line(f"Metoda: Hybrydowa (60% Computer Vision + 40% OCR)")
+        self._line()
+
+        # Szczegółowa analiza strona po stronie
+        self._line("SZCZEGÓŁOWA ANALIZA HYBRYDOWA STRONA PO STRONIE")
+        self._line("=" * 60)
+        self._file.flush()
+
+    def write_page(self, result: HybridComparisonResult):
+        self.stats.add(result)
+
+        if result.page_number_pdf2 not in (None, result.page_number):
+            self._line(f"\nSTRONA {result.page_number} (PDF 2: strona {result.page_number_pdf2})")
+        else:
+            self._line(f"\nSTRONA {result.page_number}")
+        self._line("-" * 30)
+
+        # Wyniki hybrydowe
+        self._line(f"🎯 PODOBIEŃSTWO OGÓLNE: {result.overall_similarity:.2%}")
+        self._line(f"   👁️ Analiza wizualna (CV): {result.visual_similarity_score:.2%}")
+        if result.text_similarity_score is None:
+            self._line("   📝 Analiza tekstowa (OCR): pominięta (limit czasu OCR)")
+        else:
+            self._line(f"   📝 Analiza tekstowa (OCR): {result.text_similarity_score:.2%}")
+        if result.structural_similarity_score is not None:
+            worst_tile = result.worst_tile_similarity
+            self._line(f"   🧱 Podobieństwo strukturalne (SSIM): {result.structural_similarity_score:.2%}"
+                       + (f" (najsłabszy kafelek: {worst_tile:.2%})" if worst_tile is not None else ""))
+
+        # Klasyfikacja
+        self._line(f"⚠️ Klasyfikacja: {SEVERITY_LABELS[result_severity(result)]}")
+        if result.degraded:
+            self._line(f"⏱️ Tryb uproszczony: {degradation_labels(result.degradation)}")
+
+        # Szczegóły wizualne
+        self._line(f"\n📊 ANALIZA WIZUALNA:")
+        self._line(f"   Różne piksele: {result.different_pixels:,}")
+        self._line(f"   Całkowite piksele: {result.total_pixels:,}")
+        if result.total_pixels:
+            self._line(f"   Procent różnic: {(result.different_pixels/result.total_pixels)*100:.2f}%")
+        if result.diff_mask is not None:
+            self._line(f"   Obszary zmian: {len(result.diff_mask.bounding_boxes)}")
+        if result.thumbnail_path:
+            self._line(f"   Podgląd różnic: {result.thumbnail_path}")
+            self._line(f"   Highlighted diff: {result.highlighted_diff_path or 'generowany na żądanie'}")
+
+        # Szczegóły tekstowe
+        if result.has_text_differences:
+            self._line(f"\n📝 ANALIZA TEKSTOWA:")
+            self._line(f"   Liczba linii z różnicami: {len(result.text_differences)}")
+
+            # Pokaż różnice tekstowe
+            for diff in result.text_differences:
+                if diff.startswith('---') or diff.startswith('+++'):
+                    continue
+                elif diff.startswith('-'):
+                    self._line(f"   USUNIĘTO: {diff[1:].strip()}")
+                elif diff.startswith('+'):
+                    self._line(f"   DODANO:   {diff[1:].strip()}")
+        else:
+            self._line(f"\n📝 ANALIZA TEKSTOWA: Brak różnic tekstowych")
+
+        self._line()
+        # Strona od razu widoczna w pliku
+        self._file.flush()
+
+    def write_summary(self, alignment: List[PageMatch] = None):
+        stats = self.stats
+        critical_pages = stats.pages_by_severity['critical']
+        moderate_pages = stats.pages_by_severity['moderate']
+        minor_pages = stats.pages_by_severity['minor']
+
+        # Podsumowanie wykonawcze
+        self._line("PODSUMOWANIE WYKONAWCZE")
+        self._line("-" * 40)
+        self._line(f"Łączna liczba stron: {stats.page_count}")
+        self._line(f"Strony z różnicami: {stats.pages_with_differences}")
+        self._line(f"Strony identyczne: {stats.page_count - stats.pages_with_differences}")
+        self._line(f"Średnie podobieństwo OGÓLNE: {stats.average(stats.sum_overall):.2%}")
+        self._line(f"Średnie podobieństwo WIZUALNE: {stats.average(stats.sum_visual):.2%}")
+        self._line(f"Średnie podobieństwo TEKSTOWE: {stats.average(stats.sum_text, stats.text_page_count):.2%}")
+        if stats.degraded_pages:
+            self._line(f"⏱️ Strony w trybie uproszczonym (przekroczone limity): "
+                       f"{len(stats.degraded_pages)} - {stats.degraded_pages}")
+        self._line()
+
+        # Klasyfikacja różnic
+        self._line("KLASYFIKACJA RÓŻNIC (na podstawie analizy hybrydowej)")
+        self._line("-" * 50)
+        self._line(f"🔴 Różnice krytyczne (< 50%): {len(critical_pages)} stron")
+        self._line(f"🟡 Różnice średnie (50-90%): {len(moderate_pages)} stron")
+        self._line(f"🟢 Różnice drobne (90-99%): {len(minor_pages)} stron")
+        self._line()
+
+        # Struktura dokumentu (strony dodane / usunięte / przestawione)
+        alignment = alignment or []
+        inserted_pages = [m.page2 for m in alignment if m.status == 'inserted']
+        deleted_pages = [m.page1 for m in alignment if m.status == 'deleted']
+        moved_pages = [m for m in alignment if m.status == 'moved']
+        changed_pages = [m for m in alignment if m.status == 'changed']
+
+        if inserted_pages or deleted_pages or moved_pages or changed_pages:
+            self._line("ZMIANY STRUKTURY DOKUMENTU")
+            self._line("-" * 40)
+            if inserted_pages:
+                self._line(f"➕ Strony dodane w PDF 2: {inserted_pages}")
+            if deleted_pages:
+                self._line(f"➖ Strony usunięte z PDF 1: {deleted_pages}")
+            for match in moved_pages:
+                self._line(f"🔀 Strona przestawiona: PDF 1 str. {match.page1} → PDF 2 str. {match.page2}")
+            for match in changed_pages:
+                self._line(f"✏️ Strona przepisana: PDF 1 str. {match.page1} ↔ PDF 2 str. {match.page2}")
+            self._line()
+
+        # Rekomendacje
+        self._line("REKOMENDACJE")
+        self._line("-" * 20)
+        if stats.pages_with_differences == 0 and not (inserted_pages or deleted_pages):
+            self._line("✅ Dokumenty są identyczne - brak działań wymaganych.")
+        else:
+            self._line(f"⚠️ Wykryto różnice na {stats.pages_with_differences} stronach:")
+            if critical_pages:
+                self._line(f"  🔴 Priorytet KRYTYCZNY: Strony {critical_pages}")
+            if moderate_pages:
+                self._line(f"  🟡 Priorytet ŚREDNI: Strony {moderate_pages}")
+            if minor_pages:
+                self._line(f"  🟢 Priorytet NISKI: Strony {minor_pages}")
+            if inserted_pages or deleted_pages:
+                self._line(f"  🧩 Sprawdź strony dodane/usunięte (sekcja ZMIANY STRUKTURY DOKUMENTU)")
+            if stats.degraded_pages:
+                self._line(f"  ⏱️ Sprawdź ręcznie strony w trybie uproszczonym: {stats.degraded_pages}")
+
+            self._line(f"\n📸 WIZUALIZACJE:")
+            diffs_folder = os.path.join(self.artifacts_dir or ".", "highlighted_diffs")
+            self._line(f"  Sprawdź folder '{diffs_folder}' - miniatury stron z różnicami (*_thumb)")
+            self._line(f"  Pełnowymiarowe obrazy generowane są na żądanie z zapisanej maski różnic")
+            self._line(f"  Czerwone obszary = wykryte różnice")
+
+        self._line()
+        self._line("=" * 80)
+        self._line("KONIEC HYBRYDOWEGO RAPORTU")
+        self._line("=" * 80)
+        self._file.flush()
+
+class JsonlReportWriter(ReportWriter):
+    """
+    Raport maszynowy: jeden obiekt JSON na linię (header, page..., summary)
+    """
+
+    def _record(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def write_header(self):
+        self._record({
+            'type': 'header',
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'pdf1': self.pdf1_path,
+            'pdf2': self.pdf2_path,
+            'artifacts_dir': self.artifacts_dir,
+            'method': {'visual_weight': 0.6, 'text_weight': 0.4},
+        })
+
+    def write_page(self, result: HybridComparisonResult):
+        self.stats.add(result)
+        record = {'type': 'page', 'severity': result_severity(result)}
+        record.update(result_to_dict(result))
+        self._record(record)
+
+    def write_summary(self, alignment: List[PageMatch] = None):
+        record = {'type': 'summary'}
+        record.update(self.stats.to_dict())
+        record['alignment'] = [asdict(match) for match in alignment or []]
+        self._record(record)
+
+# Dostępne formaty raportu: rozszerzenie -> klasa
+REPORT_WRITERS = {
+    'txt': TextReportWriter,
+    'jsonl': JsonlReportWriter,
+}
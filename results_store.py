@@ -0,0 +1,260 @@
+from hybrid_comparator import (
+    HybridComparisonResult, result_severity, result_to_dict, result_from_dict
+)
+from page_aligner import PageMatch
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from typing import List, Optional
+import json
+import sqlite3
+import threading
+
+@dataclass
+class StoredComparison:
+    """Zapisane porównanie pary dokumentów"""
+    comparison_id: int
+    pdf1_hash: str
+    pdf2_hash: str
+    pdf1_path: str
+    pdf2_path: str
+    settings: str
+    report_file: Optional[str]
+    created_at: str
+    page_count: int
+    pages_with_differences: int
+    avg_overall_similarity: float
+    alignment: List[PageMatch]
+
+class ResultsStore:
+    def __init__(self, db_path="comparison_results.db"):
+        """
+        db_path - lokalna baza SQLite z historią porównań
+        """
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+        self._create_schema()
+
+    def _create_schema(self):
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS comparisons (
+                id INTEGER PRIMARY KEY,
+                pdf1_hash TEXT NOT NULL,
+                pdf2_hash TEXT NOT NULL,
+                pdf1_path TEXT NOT NULL,
+                pdf2_path TEXT NOT NULL,
+                settings TEXT NOT NULL,
+                report_file TEXT,
+                created_at TEXT NOT NULL,
+                completed INTEGER NOT NULL DEFAULT 0,
+                page_count INTEGER NOT NULL DEFAULT 0,
+                pages_with_differences INTEGER NOT NULL DEFAULT 0,
+                avg_overall_similarity REAL NOT NULL DEFAULT 0,
+                alignment TEXT NOT NULL DEFAULT '[]'
+            );
+            CREATE TABLE IF NOT EXISTS page_results (
+                comparison_id INTEGER NOT NULL REFERENCES comparisons(id),
+                page_number INTEGER NOT NULL,
+                page_number_pdf2 INTEGER,
+                severity TEXT NOT NULL,
+                overall_similarity REAL NOT NULL,
+                visual_similarity REAL NOT NULL,
+                text_similarity REAL,
+                pdf1_hash TEXT NOT NULL,
+                pdf2_hash TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                result_json TEXT NOT NULL,
+                PRIMARY KEY (comparison_id, page_number)
+            );
+            CREATE INDEX IF NOT EXISTS idx_comparisons_pair
+                ON comparisons(pdf1_hash, pdf2_hash, settings, created_at);
+            CREATE INDEX IF NOT EXISTS idx_comparisons_pdf2 ON comparisons(pdf2_hash, created_at);
+            CREATE INDEX IF NOT EXISTS idx_page_results_severity ON page_results(severity, created_at);
+            CREATE INDEX IF NOT EXISTS idx_page_results_page ON page_results(page_number);
+            CREATE INDEX IF NOT EXISTS idx_page_results_pdf1 ON page_results(pdf1_hash, page_number);
+            CREATE INDEX IF NOT EXISTS idx_page_results_pdf2 ON page_results(pdf2_hash, page_number_pdf2);
+        """)
+        self._allow_missing_text_similarity()
+        self._index_pdf2_page_numbers()
+        self.conn.commit()
+
+    def _allow_missing_text_similarity(self):
+        """
+        Bazy sprzed stron bez OCR (limit czasu): text_similarity było NOT NULL -
+        SQLite nie zdejmuje ograniczenia, więc tabela jest przebudowywana
+        """
+        columns = {row[1]: row[3] for row in self.conn.execute("PRAGMA table_info(page_results)")}
+        if not columns.get('text_similarity'):
+            return
+        schema = self.conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'page_results'"
+        ).fetchone()[0]
+        with self.conn:
+            self.conn.execute(schema.replace("page_results", "page_results_migrated", 1)
+                              .replace("text_similarity REAL NOT NULL", "text_similarity REAL"))
+            self.conn.execute("INSERT INTO page_results_migrated SELECT * FROM page_results")
+            self.conn.execute("DROP TABLE page_results")
+            self.conn.execute("ALTER TABLE page_results_migrated RENAME TO page_results")
+        self._create_schema()  # indeksy usunięte razem ze starą tabelą
+
+    def _index_pdf2_page_numbers(self):
+        """
+        Starsze bazy indeksowały stronę PDF 2 numerem strony PDF 1 - indeks jest odtwarzany
+        na page_number_pdf2, którego używa page_history
+        """
+        columns = [row[2] for row in self.conn.execute("PRAGMA index_info(idx_page_results_pdf2)")]
+        if columns == ['pdf2_hash', 'page_number_pdf2']:
+            return
+        self.conn.execute("DROP INDEX IF EXISTS idx_page_results_pdf2")
+        self.conn.execute(
+            "CREATE INDEX idx_page_results_pdf2 ON page_results(pdf2_hash, page_number_pdf2)"
+        )
+
+    # === ZAPIS ===
+
+    def start_comparison(self, pdf1_hash, pdf2_hash, pdf1_path, pdf2_path, settings="") -> int:
+        """
+        Rejestruje nowe porównanie; strony dopisywane są przez add_page_result
+        """
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO comparisons (pdf1_hash, pdf2_hash, pdf1_path, pdf2_path, settings, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (pdf1_hash, pdf2_hash, pdf1_path, pdf2_path, settings, _now())
+            )
+            return cursor.lastrowid
+
+    def add_page_result(self, comparison_id, result: HybridComparisonResult):
+        with self._lock, self.conn:
+            pdf1_hash, pdf2_hash, created_at = self.conn.execute(
+                "SELECT pdf1_hash, pdf2_hash, created_at FROM comparisons WHERE id = ?", (comparison_id,)
+            ).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO page_results (comparison_id, page_number, page_number_pdf2, severity, "
+                "overall_similarity, visual_similarity, text_similarity, pdf1_hash, pdf2_hash, created_at, "
+                "result_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    comparison_id, result.page_number, result.page_number_pdf2,
+                    result_severity(result),
+                    result.overall_similarity, result.visual_similarity_score, result.text_similarity_score,
+                    pdf1_hash, pdf2_hash, created_at,
+                    json.dumps(result_to_dict(result), ensure_ascii=False)
+                )
+            )
+
+    def finish_comparison(self, comparison_id, report_file=None, alignment: List[PageMatch] = None):
+        """
+        Zamyka porównanie - od tej chwili jest widoczne jako wynik gotowy do ponownego użycia
+        """
+        with self._lock, self.conn:
+            page_count, with_differences, avg_overall = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(severity != 'identical'), 0), "
+                "COALESCE(AVG(overall_similarity), 0) FROM page_results WHERE comparison_id = ?",
+                (comparison_id,)
+            ).fetchone()
+            self.conn.execute(
+                "UPDATE comparisons SET completed = 1, report_file = ?, page_count = ?, "
+                "pages_with_differences = ?, avg_overall_similarity = ?, alignment = ? WHERE id = ?",
+                (
+                    report_file, page_count, with_differences, avg_overall,
+                    json.dumps([asdict(match) for match in alignment or []]),
+                    comparison_id
+                )
+            )
+
+    def save_comparison(self, pdf1_hash, pdf2_hash, pdf1_path, pdf2_path, results,
+                        settings="", report_file=None, alignment=None) -> int:
+        """
+        Zapisuje komplet wyników jednym wywołaniem
+        """
+        comparison_id = self.start_comparison(pdf1_hash, pdf2_hash, pdf1_path, pdf2_path, settings)
+        for result in results:
+            self.add_page_result(comparison_id, result)
+        self.finish_comparison(comparison_id, report_file, alignment)
+        return comparison_id
+
+    # === ODCZYT ===
+
+    def find_latest(self, pdf1_hash, pdf2_hash, settings="") -> Optional[StoredComparison]:
+        """
+        Ostatnie zakończone porównanie tej pary (przy tych samych ustawieniach)
+        """
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT {_COMPARISON_COLUMNS} FROM comparisons "
+                "WHERE pdf1_hash = ? AND pdf2_hash = ? AND settings = ? AND completed = 1 "
+                "ORDER BY created_at DESC, id DESC LIMIT 1",
+                (pdf1_hash, pdf2_hash, settings)
+            ).fetchone()
+        return _comparison_from_row(row) if row else None
+
+    def load_results(self, comparison_id) -> List[HybridComparisonResult]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT result_json FROM page_results WHERE comparison_id = ? ORDER BY page_number",
+                (comparison_id,)
+            ).fetchall()
+        return [result_from_dict(json.loads(result_json)) for (result_json,) in rows]
+
+    def pages_by_severity(self, severity, since: datetime = None, limit=1000):
+        """
+        Strony danej klasy od podanej chwili, np. pages_by_severity('critical', tydzień temu)
+        Zwraca listę (comparison_id, page_number, overall_similarity, created_at)
+        """
+        since = since or datetime.now() - timedelta(days=7)
+        with self._lock:
+            return self.conn.execute(
+                "SELECT comparison_id, page_number, overall_similarity, created_at FROM page_results "
+                "WHERE severity = ? AND created_at >= ? ORDER BY created_at DESC LIMIT ?",
+                (severity, since.isoformat(timespec='seconds'), limit)
+            ).fetchall()
+
+    def history_for_document(self, file_hash, limit=100) -> List[StoredComparison]:
+        """
+        Porównania, w których dokument występował jako PDF 1 lub PDF 2
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {_COMPARISON_COLUMNS} FROM comparisons WHERE pdf1_hash = ? AND completed = 1 "
+                f"UNION ALL SELECT {_COMPARISON_COLUMNS} FROM comparisons WHERE pdf2_hash = ? AND completed = 1 "
+                "AND pdf1_hash != ? ORDER BY created_at DESC LIMIT ?",
+                (file_hash, file_hash, file_hash, limit)
+            ).fetchall()
+        return [_comparison_from_row(row) for row in rows]
+
+    def page_history(self, file_hash, page_number, limit=100):
+        """
+        Wyniki konkretnej strony dokumentu we wszystkich porównaniach - jako strony PDF 1
+        (page_number) lub PDF 2 (page_number_pdf2, numer po wyrównaniu stron)
+        """
+        with self._lock:
+            return self.conn.execute(
+                "SELECT comparison_id, severity, overall_similarity, created_at FROM page_results "
+                "WHERE pdf1_hash = ? AND page_number = ? "
+                "UNION ALL SELECT comparison_id, severity, overall_similarity, created_at FROM page_results "
+                "WHERE pdf2_hash = ? AND page_number_pdf2 = ? AND NOT (pdf1_hash = ? AND page_number = ?) "
+                "ORDER BY created_at DESC LIMIT ?",
+                (file_hash, page_number, file_hash, page_number, file_hash, page_number, limit)
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+_COMPARISON_COLUMNS = (
+    "id, pdf1_hash, pdf2_hash, pdf1_path, pdf2_path, settings, report_file, created_at, "
+    "page_count, pages_with_differences, avg_overall_similarity, alignment"
+)
+
+def _comparison_from_row(row) -> StoredComparison:
+    *values, alignment = row
+    return StoredComparison(*values, [PageMatch(**match) for match in json.loads(alignment)])
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+# Test modułu
+if __name__ == "__main__":
+    store = ResultsStore()
+    print("Results Store gotowy!")
@@ -0,0 +1,23 @@
+from document_index import DocumentIndex, PageSignature
+from fingerprints import minhash_signature, text_shingles
+
+def _signature(page_number, image_hash, text):
+    return PageSignature(page_number, image_hash, minhash_signature(text_shingles(text)))
+
+def test_query_with_blank_page(tmp_path, monkeypatch):
+    """Pusta strona (pusty MinHash, dHash 0) nie ma kubełków LSH - zapytanie nie może się wysypać"""
+    index = DocumentIndex(db_path=str(tmp_path / "index.db"))
+    pdf_path = tmp_path / "library.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 library")
+
+    text = "umowa sprzedaży zawarta pomiędzy stronami w dniu podpisania niniejszej umowy"
+    monkeypatch.setattr(index, "fingerprint_document",
+                        lambda path: [_signature(1, 0x12345678_5a3c0ff1, text)])
+    document_id = index.add_document(str(pdf_path))
+
+    blank = _signature(1, 0, "")
+    assert DocumentIndex._page_buckets(blank) == []
+    assert index.query_signatures([blank]) == []
+
+    matches = index.query_signatures([blank, _signature(2, 0x12345678_5a3c0ff1, text)])
+    assert [match.document_id for match in matches] == [document_id]
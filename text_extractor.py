@@ -1,35 +1,124 @@
 import pytesseract
 from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
 import os
+import threading
 
 class TextExtractor:
-    def __init__(self):
+    def __init__(self, timeout=0, workers=1):
+        """
+        timeout - limit czasu OCR jednej strony w sekundach (0 = bez limitu)
+        workers - liczba równoległych procesów Tesseract (pula tworzona raz, współdzielona)
+        """
         # Ustaw ścieżkę do Tesseract
         pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+        self.timeout = timeout
+        # Obrazy, dla których OCR przekroczył limit czasu (strona porównywana tylko wizualnie)
+        self.timed_out = set()
+        self.workers = workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+    
+    def close(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
     
-    def extract_text_from_image(self, image_path):
+    def _get_executor(self) -> ThreadPoolExecutor:
         """
-        Wyciąga tekst z pojedynczego obrazu
+        Wspólna pula OCR tworzona przy pierwszym użyciu (jedna, także przy równoległych zadaniach)
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ocr")
+            return self._executor
+    
+    def _ocr_failed(self, image_path, error):
+        if 'timeout' in str(error).lower():
+            print(f"⏱️ Limit czasu OCR dla {image_path} - strona tylko z analizą wizualną")
+            self.timed_out.add(image_path)
+        else:
+            print(f"❌ Błąd OCR dla {image_path}: {error}")
+    
+    def extract_text_from_image(self, image_path, ignore_template=None, page_number=None):
+        """
+        Wyciąga tekst z pojedynczego obrazu (z pominięciem obszarów ignore_template)
         """
         try:
             image = Image.open(image_path)
+            if ignore_template:
+                image = ignore_template.apply_to_image(image, page_number)
             # Konfiguracja OCR - lepsze wyniki dla dokumentów
             config = '--oem 3 --psm 6'
-            text = pytesseract.image_to_string(image, config=config, lang='eng+pol')
+            text = pytesseract.image_to_string(image, config=config, lang='eng+pol',
+                                               timeout=self.timeout)
+            self.timed_out.discard(image_path)
             return text.strip()
         except Exception as e:
-            print(f"❌ Błąd OCR dla {image_path}: {e}")
+            self._ocr_failed(image_path, e)
             return ""
     
-    def extract_text_from_pdf_images(self, image_paths):
+    def extract_text_and_words(self, image_path, ignore_template=None, page_number=None):
+        """
+        Jeden przebieg OCR: tekst + słowa z pozycjami (left, top, width, height, conf)
+        """
+        try:
+            image = Image.open(image_path)
+            if ignore_template:
+                image = ignore_template.apply_to_image(image, page_number)
+            config = '--oem 3 --psm 6'
+            data = pytesseract.image_to_data(
+                image, config=config, lang='eng+pol', output_type=pytesseract.Output.DICT,
+                timeout=self.timeout
+            )
+            self.timed_out.discard(image_path)
+        except Exception as e:
+            self._ocr_failed(image_path, e)
+            return "", []
+        
+        words = []
+        lines = {}
+        for i, word in enumerate(data['text']):
+            word = word.strip()
+            if not word:
+                continue
+            words.append({
+                'text': word,
+                'left': data['left'][i],
+                'top': data['top'][i],
+                'width': data['width'][i],
+                'height': data['height'][i],
+                'conf': float(data['conf'][i])
+            })
+            # Odtwórz linie tekstu w kolejności czytania
+            line_key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(line_key, []).append(word)
+        
+        text = "\n".join(" ".join(line) for line in lines.values())
+        return text, words
+    
+    def extract_text_from_pdf_images(self, image_paths, ignore_template=None):
         """
         Wyciąga tekst ze wszystkich obrazów PDF
         """
         all_text = {}
         
+        if self.workers > 1:
+            executor = self._get_executor()
+            print(f"🔍 Analizuję {len(image_paths)} stron ({self.workers} procesy OCR)...")
+            futures = [
+                executor.submit(self.extract_text_from_image, image_path, ignore_template, i + 1)
+                for i, image_path in enumerate(image_paths)
+            ]
+            for i, future in enumerate(futures):
+                all_text[f"page_{i+1}"] = future.result()
+                print(f"✅ Strona {i+1}: {len(all_text[f'page_{i+1}'])} znaków")
+            return all_text
+        
         for i, image_path in enumerate(image_paths):
             print(f"🔍 Analizuję stronę {i+1}...")
-            text = self.extract_text_from_image(image_path)
+            text = self.extract_text_from_image(image_path, ignore_template, i + 1)
             all_text[f"page_{i+1}"] = text
             print(f"✅ Strona {i+1}: {len(text)} znaków")
         
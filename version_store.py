@@ -0,0 +1,291 @@
+from hybrid_comparator import HybridComparator
+from pdf_processor import DEFAULT_RENDER_BACKEND
+from page_aligner import PageFingerprint
+from fingerprints import perceptual_hash, text_shingles, file_digest
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+
+@dataclass
+class StoredPage:
+    """Zapamiętana analiza jednej strony wersji"""
+    page_number: int
+    raster_digest: str
+    image_path: str
+    text: str
+    words: List[dict] = field(repr=False)
+    image_hash: int = 0
+    ocr_timed_out: bool = False  # tekst pusty po limicie czasu OCR - nie jest wykorzystywany ponownie
+
+@dataclass
+class DocumentVersion:
+    """Przeanalizowana wersja dokumentu"""
+    version_id: int
+    document_key: str
+    version: int
+    pdf_path: str
+    file_hash: str
+    pages: List[StoredPage]
+    ignore_key: str = ''
+
+    @property
+    def image_paths(self) -> List[str]:
+        return [page.image_path for page in self.pages]
+
+    @property
+    def texts(self) -> Dict[str, str]:
+        return {f"page_{page.page_number}": page.text for page in self.pages}
+
+    @property
+    def digests(self) -> List[str]:
+        return [page.raster_digest for page in self.pages]
+
+    @property
+    def fingerprints(self) -> List[PageFingerprint]:
+        return [
+            PageFingerprint(page.page_number, page.image_hash, text_shingles(page.text))
+            for page in self.pages
+        ]
+
+def raster_digest(image_path, chunk_size=1024 * 1024):
+    """
+    Skrót wyrenderowanej strony (poppler daje deterministyczny wynik dla tej samej strony, DPI i backendu)
+    """
+    digest = hashlib.sha1()
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class DocumentVersionStore:
+    def __init__(self, store_dir="version_store", comparator: HybridComparator = None, keep_rasters=2,
+                 render_backend=DEFAULT_RENDER_BACKEND):
+        """
+        store_dir - folder z bazą SQLite i rastrami wersji
+        keep_rasters - ile ostatnich wersji dokumentu trzyma rastry na dysku (min. 2 - poprzednia jest potrzebna do diffu)
+        render_backend - stały backend renderowania zamiast 'auto' (pomiar w każdym procesie może wybrać
+                         inny backend/format, a wtedy skróty rastrów między sesjami się nie zgadzają)
+        """
+        self.store_dir = store_dir
+        self.comparator = comparator or HybridComparator()
+        if self.comparator.processor.backend == 'auto':
+            self.comparator.processor.backend = render_backend
+        self.keep_rasters = max(2, keep_rasters)
+        os.makedirs(store_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(store_dir, "versions.db"), check_same_thread=False)
+        self._create_schema()
+
+    def _create_schema(self):
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS versions (
+                id INTEGER PRIMARY KEY,
+                document_key TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                pdf_path TEXT NOT NULL,
+                file_hash TEXT NOT NULL,
+                dpi INTEGER NOT NULL,
+                ignore_key TEXT NOT NULL DEFAULT '',
+                backend TEXT NOT NULL DEFAULT '',
+                created_at TEXT NOT NULL,
+                UNIQUE (document_key, version)
+            );
+            CREATE TABLE IF NOT EXISTS version_pages (
+                version_id INTEGER NOT NULL REFERENCES versions(id),
+                page_number INTEGER NOT NULL,
+                raster_digest TEXT NOT NULL,
+                image_path TEXT,
+                text TEXT NOT NULL,
+                words TEXT NOT NULL,
+                image_hash TEXT NOT NULL,
+                ocr_timed_out INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (version_id, page_number)
+            );
+            CREATE INDEX IF NOT EXISTS idx_version_pages_digest ON version_pages(raster_digest);
+        """)
+        # Bazy sprzed nowych kolumn
+        self._add_missing_column("version_pages", "ocr_timed_out", "INTEGER NOT NULL DEFAULT 0")
+        self._add_missing_column("versions", "ignore_key", "TEXT NOT NULL DEFAULT ''")
+        self._add_missing_column("versions", "backend", "TEXT NOT NULL DEFAULT ''")
+        self.conn.commit()
+
+    def _add_missing_column(self, table, column, definition):
+        columns = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _ignore_key(self) -> str:
+        """Szablon obszarów ignorowanych zmienia tekst OCR - analiza z innym szablonem nie jest współdzielona"""
+        template = self.comparator.ignore_template
+        return template.key() if template else ''
+
+    # === ODCZYT ===
+
+    def latest_version(self, document_key) -> DocumentVersion:
+        row = self.conn.execute(
+            "SELECT id FROM versions WHERE document_key = ? ORDER BY version DESC LIMIT 1",
+            (document_key,)
+        ).fetchone()
+        return self.get_version(row[0]) if row else None
+
+    def get_version(self, version_id) -> DocumentVersion:
+        row = self.conn.execute(
+            "SELECT id, document_key, version, pdf_path, file_hash, ignore_key FROM versions WHERE id = ?",
+            (version_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        pages = [
+            StoredPage(
+                page_number=page_number,
+                raster_digest=digest,
+                image_path=image_path,
+                text=text,
+                words=json.loads(words),
+                image_hash=int(image_hash, 16),
+                ocr_timed_out=bool(ocr_timed_out)
+            )
+            for page_number, digest, image_path, text, words, image_hash, ocr_timed_out in self.conn.execute(
+                "SELECT page_number, raster_digest, image_path, text, words, image_hash, ocr_timed_out "
+                "FROM version_pages WHERE version_id = ? ORDER BY page_number",
+                (version_id,)
+            )
+        ]
+        return DocumentVersion(row[0], row[1], row[2], row[3], row[4], pages, row[5])
+
+    def _find_analysed_page(self, document_key, digest, dpi, backend, ignore_key):
+        """
+        Szuka wcześniej przeanalizowanej strony o tym samym rastrze (DPI, backend) i szablonie obszarów
+        ignorowanych (dowolna wersja dokumentu); strony z przerwanym OCR (limit czasu) nie są brane pod uwagę
+        """
+        return self.conn.execute(
+            "SELECT p.text, p.words, p.image_hash FROM version_pages p "
+            "JOIN versions v ON v.id = p.version_id "
+            "WHERE p.raster_digest = ? AND v.document_key = ? AND v.dpi = ? AND v.backend = ? "
+            "AND v.ignore_key = ? AND p.ocr_timed_out = 0 LIMIT 1",
+            (digest, document_key, dpi, backend, ignore_key)
+        ).fetchone()
+
+    # === ZAPIS ===
+
+    def add_version(self, document_key, pdf_path) -> DocumentVersion:
+        """
+        Renderuje nową wersję; OCR i odciski liczone tylko dla stron, których rastra jeszcze nie było
+        """
+        file_hash = file_digest(pdf_path)
+        ignore_key = self._ignore_key()
+        latest = self.latest_version(document_key)
+        if latest and latest.file_hash == file_hash and latest.ignore_key == ignore_key:
+            print(f"⏭️ Wersja {latest.version} dokumentu '{document_key}' ma ten sam plik")
+            return latest
+
+        version = latest.version + 1 if latest else 1
+        dpi = self.comparator.processor.dpi
+        backend = self.comparator.processor.backend
+        version_folder = os.path.join(self.store_dir, _safe_name(document_key), f"v{version}")
+
+        print(f"\n📄 Wersja {version} dokumentu '{document_key}': {pdf_path}")
+        image_paths = self.comparator.processor.pdf_to_images(pdf_path, version_folder)
+
+        pages = []
+        reused = 0
+        for i, image_path in enumerate(image_paths):
+            digest = raster_digest(image_path)
+            known = self._find_analysed_page(document_key, digest, dpi, backend, ignore_key)
+            timed_out = False
+            if known:
+                text, words, image_hash = known[0], json.loads(known[1]), int(known[2], 16)
+                reused += 1
+            else:
+                print(f"🔍 Analizuję zmienioną stronę {i+1}...")
+                text, words = self.comparator.extractor.extract_text_and_words(
+                    image_path, self.comparator.ignore_template, i + 1
+                )
+                image_hash = perceptual_hash(image_path)
+                timed_out = image_path in self.comparator.extractor.timed_out
+            pages.append(StoredPage(i + 1, digest, image_path, text, words, image_hash, timed_out))
+
+        print(f"♻️ Wykorzystano poprzednią analizę dla {reused}/{len(pages)} stron")
+
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO versions (document_key, version, pdf_path, file_hash, dpi, backend, ignore_key, "
+                "created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (document_key, version, os.path.abspath(pdf_path), file_hash, dpi, backend, ignore_key,
+                 datetime.now().isoformat(timespec='seconds'))
+            )
+            version_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO version_pages (version_id, page_number, raster_digest, image_path, "
+                "text, words, image_hash, ocr_timed_out) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (version_id, page.page_number, page.raster_digest, page.image_path,
+                     page.text, json.dumps(page.words, ensure_ascii=False), format(page.image_hash, 'x'),
+                     int(page.ocr_timed_out))
+                    for page in pages
+                ]
+            )
+
+        self._prune_rasters(document_key)
+        return DocumentVersion(version_id, document_key, version, pdf_path, file_hash, pages, ignore_key)
+
+    def _prune_rasters(self, document_key):
+        """
+        Usuwa rastry starszych wersji (skróty, tekst i odciski zostają w bazie)
+        """
+        old_versions = self.conn.execute(
+            "SELECT id, version FROM versions WHERE document_key = ? ORDER BY version DESC LIMIT -1 OFFSET ?",
+            (document_key, self.keep_rasters)
+        ).fetchall()
+        for version_id, version in old_versions:
+            shutil.rmtree(
+                os.path.join(self.store_dir, _safe_name(document_key), f"v{version}"),
+                ignore_errors=True
+            )
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE version_pages SET image_path = NULL WHERE version_id = ?", (version_id,)
+                )
+
+    # === PORÓWNANIE ===
+
+    def compare_new_version(self, document_key, pdf_path):
+        """
+        Porównuje nową wersję z poprzednią, przetwarzając tylko nowy plik
+        """
+        previous = self.latest_version(document_key)
+        current = self.add_version(document_key, pdf_path)
+
+        if previous is None or previous.version_id == current.version_id:
+            print("ℹ️ Brak poprzedniej wersji do porównania")
+            return previous or current, current, []
+
+        # Flaga limitu czasu OCR zapisana w bazie - strona porównywana tylko wizualnie (tryb uproszczony)
+        self.comparator.extractor.timed_out.update(
+            page.image_path for page in previous.pages + current.pages
+            if page.ocr_timed_out and page.image_path
+        )
+
+        results = self.comparator.compare_prepared(
+            previous.image_paths, current.image_paths,
+            previous.texts, current.texts,
+            fingerprints1=previous.fingerprints, fingerprints2=current.fingerprints,
+            digests1=previous.digests, digests2=current.digests
+        )
+        return previous, current, results
+
+    def close(self):
+        self.conn.close()
+
+def _safe_name(document_key):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in document_key)
+
+# Test modułu
+if __name__ == "__main__":
+    store = DocumentVersionStore()
+    print("Document Version Store gotowy!")
@@ -1,22 +1,120 @@
 import cv2
 import numpy as np
 from PIL import Image
+from diff_mask import DiffMask, _tile_max
+from concurrent.futures import ThreadPoolExecutor
 import os
 
 class VisualComparator:
-    def __init__(self, threshold=30):
+    def __init__(self, threshold=30, thumbnail_size=480, max_pixels=None,
+                 ssim_size=1024, ssim_window=7, ssim_tile=32):
         """
         threshold - próg różnicy pikseli (0-255)
+        thumbnail_size - dłuższy bok miniatury podglądu (px)
+        max_pixels - limit pikseli diffu; większe strony są porównywane po pomniejszeniu
+        ssim_size - dłuższy bok rastra, na którym liczone jest SSIM (px)
+        ssim_window - bok okna SSIM (filtr pudełkowy)
+        ssim_tile - bok kafelka mapy SSIM w pikselach rastra SSIM
         """
         self.threshold = threshold
+        self.thumbnail_size = thumbnail_size
+        self.max_pixels = max_pixels
+        self.ssim_size = ssim_size
+        self.ssim_window = ssim_window
+        self.ssim_tile = ssim_tile
     
-    def compare_images(self, img1_path, img2_path):
+    def _read_within_budget(self, path):
         """
-        Porównuje dwa obrazy wizualnie
+        Wczytuje obraz tak, by nie przekroczył max_pixels (dekodowanie od razu w 1/2, 1/4, 1/8)
         """
-        # Wczytaj obrazy
-        img1 = cv2.imread(img1_path)
-        img2 = cv2.imread(img2_path)
+        if not self.max_pixels:
+            return cv2.imread(path), False
+        
+        with Image.open(path) as image:
+            width, height = image.size
+        if width * height <= self.max_pixels:
+            return cv2.imread(path), False
+        
+        flag = cv2.IMREAD_REDUCED_COLOR_8
+        for factor, reduced_flag in ((2, cv2.IMREAD_REDUCED_COLOR_2), (4, cv2.IMREAD_REDUCED_COLOR_4)):
+            if width * height <= self.max_pixels * factor * factor:
+                flag = reduced_flag
+                break
+        img = cv2.imread(path, flag)
+        
+        # Nawet 1/8 za duże - dodatkowe skalowanie
+        if img is not None and img.shape[0] * img.shape[1] > self.max_pixels:
+            scale = (self.max_pixels / (img.shape[0] * img.shape[1])) ** 0.5
+            img = cv2.resize(img, (max(1, int(img.shape[1] * scale)), max(1, int(img.shape[0] * scale))),
+                             interpolation=cv2.INTER_AREA)
+        return img, True
+    
+    def structural_similarity(self, img1, img2, ignore_template=None, page_number=None):
+        """
+        SSIM na pomniejszonych rastrach w skali szarości - średnie i wariancje z filtrów pudełkowych
+        (koszt rzędu absdiff). Zwraca (średnie SSIM 0-1, mapa SSIM kafelków jako lista wierszy).
+        """
+        h, w = img1.shape[:2]
+        scale = min(1.0, self.ssim_size / max(h, w))
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        
+        def prepare(img):
+            if scale < 1.0:
+                img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+            if img.ndim == 3:
+                img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            return img.astype(np.float32)
+        
+        x, y = prepare(img1), prepare(img2)
+        
+        # Obszary ignorowane: te same piksele w obu obrazach - SSIM = 1
+        if ignore_template:
+            keep_mask, _ = ignore_template.keep_mask(size[1], size[0], page_number)
+            y = np.where(keep_mask > 0, y, x)
+        
+        c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+        window = (self.ssim_window, self.ssim_window)
+        mu_x = cv2.boxFilter(x, -1, window)
+        mu_y = cv2.boxFilter(y, -1, window)
+        sigma_x = cv2.boxFilter(x * x, -1, window) - mu_x * mu_x
+        sigma_y = cv2.boxFilter(y * y, -1, window) - mu_y * mu_y
+        sigma_xy = cv2.boxFilter(x * y, -1, window) - mu_x * mu_y
+        
+        ssim_map = ((2 * mu_x * mu_y + c1) * (2 * sigma_xy + c2)) / \
+                   ((mu_x * mu_x + mu_y * mu_y + c1) * (sigma_x + sigma_y + c2))
+        np.clip(ssim_map, 0.0, 1.0, out=ssim_map)
+        
+        # Mapa kafelków: średnie SSIM w kafelkach ssim_tile x ssim_tile
+        tiles = (max(1, -(-size[0] // self.ssim_tile)), max(1, -(-size[1] // self.ssim_tile)))
+        tile_map = cv2.resize(ssim_map, tiles, interpolation=cv2.INTER_AREA)
+        
+        return float(ssim_map.mean()), np.round(tile_map.astype(np.float64), 3).tolist()
+    
+    def compare_structure(self, img1_path, img2_path, ignore_template=None, page_number=None):
+        """
+        SSIM dwóch plików (np. podglądów dużych stron) - dekodowanie od razu w skali szarości
+        """
+        img1 = cv2.imread(img1_path, cv2.IMREAD_GRAYSCALE)
+        img2 = cv2.imread(img2_path, cv2.IMREAD_GRAYSCALE)
+        if img1 is None or img2 is None:
+            raise ValueError("Nie można wczytać obrazów")
+        if img1.shape != img2.shape:
+            target_h, target_w = min(img1.shape[0], img2.shape[0]), min(img1.shape[1], img2.shape[1])
+            img1 = cv2.resize(img1, (target_w, target_h))
+            img2 = cv2.resize(img2, (target_w, target_h))
+        return self.structural_similarity(img1, img2, ignore_template, page_number)
+    
+    def compare_images(self, img1_path, img2_path, thumbnail_path=None,
+                       ignore_template=None, page_number=None, structural=False):
+        """
+        Porównuje dwa obrazy wizualnie.
+        Jeśli są różnice, zwraca kompaktową maskę (diff_mask) i zapisuje miniaturę podglądu.
+        ignore_template - IgnoreTemplate; piksele w jego obszarach nie są liczone
+        structural - policz też SSIM z mapą kafelków (structural_similarity, structural_map)
+        """
+        # Wczytaj obrazy (duże strony - od razu pomniejszone do limitu pikseli)
+        img1, downscaled1 = self._read_within_budget(img1_path)
+        img2, downscaled2 = self._read_within_budget(img2_path)
         
         if img1 is None or img2 is None:
             raise ValueError("Nie można wczytać obrazów")
@@ -31,28 +129,179 @@ class VisualComparator:
             img1 = cv2.resize(img1, (target_w, target_h))
             img2 = cv2.resize(img2, (target_w, target_h))
         
+        structural_similarity, structural_map = None, None
+        if structural:
+            structural_similarity, structural_map = self.structural_similarity(
+                img1, img2, ignore_template, page_number
+            )
+        
         # Oblicz różnicę
         diff = cv2.absdiff(img1, img2)
         
         # Konwertuj do grayscale dla analizy
         gray_diff = cv2.cvtColor(diff, cv2.COLOR_BGR2GRAY)
         
+        # Pomiń obszary ignorowane (maska skompilowana raz na rozmiar strony)
+        total_pixels = gray_diff.shape[0] * gray_diff.shape[1]
+        if ignore_template:
+            keep_mask, total_pixels = ignore_template.keep_mask(*gray_diff.shape[:2], page_number)
+            gray_diff = cv2.bitwise_and(gray_diff, keep_mask)
+        
         # Znajdź piksele z różnicami
         _, thresh = cv2.threshold(gray_diff, self.threshold, 255, cv2.THRESH_BINARY)
         
         # Oblicz metryki
-        total_pixels = thresh.shape[0] * thresh.shape[1]
         different_pixels = cv2.countNonZero(thresh)
-        similarity = 1.0 - (different_pixels / total_pixels)
+        similarity = 1.0 - (different_pixels / total_pixels) if total_pixels else 1.0
+        
+        # Artefakty tylko dla stron z różnicami
+        diff_mask = None
+        if different_pixels > 0:
+            diff_mask = DiffMask.from_threshold(thresh, gray_diff)
+            if thumbnail_path:
+                thumbnail_path = self.create_thumbnail(img1, thresh, thumbnail_path)
+        else:
+            thumbnail_path = None
         
         return {
             'similarity': similarity,
             'different_pixels': different_pixels,
             'total_pixels': total_pixels,
             'diff_image': diff,
-            'threshold_image': thresh
+            'threshold_image': thresh,
+            'diff_mask': diff_mask,
+            'thumbnail_path': thumbnail_path,
+            'downscaled': downscaled1 or downscaled2,
+            'structural_similarity': structural_similarity,
+            'structural_map': structural_map
         }
     
+    def compare_tiled(self, page1, page2, render_tile, tile_size=4096, preview_path=None,
+                      thumbnail_path=None, ignore_template=None, page_number=None):
+        """
+        Porównanie dużej strony kafelkami w pełnym DPI (page1/page2 - TiledPage).
+        W pamięci są najwyżej dwa kafelki naraz; identyczne kafelki są pomijane od razu.
+        Maska różnic powstaje w skali podglądu (DPI / factor) - max z bloków factor x factor.
+        render_tile(page, x, y, width, height) - zwraca kafelek BGR
+        """
+        factor = page1.factor
+        width, height = min(page1.width, page2.width), min(page1.height, page2.height)
+        # Kafelki wyrównane do bloków podglądu
+        tile = max(factor, tile_size // factor * factor)
+        
+        preview_h, preview_w = -(-height // factor), -(-width // factor)
+        preview_thresh = np.zeros((preview_h, preview_w), dtype=np.uint8)
+        preview_gray = np.zeros((preview_h, preview_w), dtype=np.uint8)
+        
+        different_pixels = 0
+        total_pixels = 0
+        tile_count = identical_tiles = 0
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for y in range(0, height, tile):
+                for x in range(0, width, tile):
+                    tile_w, tile_h = min(tile, width - x), min(tile, height - y)
+                    future1 = executor.submit(render_tile, page1, x, y, tile_w, tile_h)
+                    future2 = executor.submit(render_tile, page2, x, y, tile_w, tile_h)
+                    tile1, tile2 = future1.result(), future2.result()
+                    tile_count += 1
+                    
+                    # Poppler może zwrócić kafelek o piksel mniejszy na krawędzi strony
+                    tile_h = min(tile_h, tile1.shape[0], tile2.shape[0])
+                    tile_w = min(tile_w, tile1.shape[1], tile2.shape[1])
+                    tile1, tile2 = tile1[:tile_h, :tile_w], tile2[:tile_h, :tile_w]
+                    
+                    keep_mask = None
+                    if ignore_template:
+                        keep_mask, kept = ignore_template.keep_mask_tile(
+                            height, width, x, y, tile_w, tile_h, page_number
+                        )
+                        total_pixels += kept
+                    else:
+                        total_pixels += tile_w * tile_h
+                    
+                    if np.array_equal(tile1, tile2):
+                        identical_tiles += 1
+                        continue
+                    
+                    gray_diff = cv2.cvtColor(cv2.absdiff(tile1, tile2), cv2.COLOR_BGR2GRAY)
+                    del tile1, tile2
+                    if keep_mask is not None:
+                        gray_diff = cv2.bitwise_and(gray_diff, keep_mask)
+                    _, thresh = cv2.threshold(gray_diff, self.threshold, 255, cv2.THRESH_BINARY)
+                    
+                    changed = cv2.countNonZero(thresh)
+                    if changed == 0:
+                        continue
+                    different_pixels += changed
+                    
+                    # Wklej kafelek w skali podglądu
+                    pooled_thresh = _tile_max(thresh, factor)
+                    pooled_gray = _tile_max(gray_diff, factor)
+                    py, px = y // factor, x // factor
+                    ph, pw = pooled_thresh.shape
+                    preview_thresh[py:py + ph, px:px + pw] = pooled_thresh
+                    preview_gray[py:py + ph, px:px + pw] = pooled_gray
+        
+        print(f"   🧱 Kafelki: {tile_count} (identyczne: {identical_tiles})")
+        similarity = 1.0 - (different_pixels / total_pixels) if total_pixels else 1.0
+        
+        diff_mask = None
+        if different_pixels > 0:
+            diff_mask = DiffMask.from_threshold(preview_thresh, preview_gray)
+            preview = cv2.imread(preview_path) if preview_path else None
+            if thumbnail_path and preview is not None:
+                thumbnail_path = self.create_thumbnail(preview, preview_thresh, thumbnail_path)
+            else:
+                thumbnail_path = None
+        else:
+            thumbnail_path = None
+        
+        return {
+            'similarity': similarity,
+            'different_pixels': different_pixels,
+            'total_pixels': total_pixels,
+            'diff_mask': diff_mask,
+            'thumbnail_path': thumbnail_path,
+            'downscaled': False,
+            'tiles': tile_count,
+            'identical_tiles': identical_tiles
+        }
+    
+    def create_thumbnail(self, img, thresh, output_path):
+        """
+        Mała miniatura z podświetlonymi różnicami (WebP, a gdy brak kodeka - JPEG)
+        """
+        h, w = thresh.shape[:2]
+        scale = min(1.0, self.thumbnail_size / max(h, w))
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        
+        # Skalowanie przed podświetleniem - bez pełnowymiarowej kopii obrazu
+        small = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        small_mask = cv2.resize(thresh, size, interpolation=cv2.INTER_AREA)
+        small[small_mask > 0] = [0, 0, 255]
+        
+        if not cv2.imwrite(output_path, small, [cv2.IMWRITE_WEBP_QUALITY, 80]):
+            output_path = os.path.splitext(output_path)[0] + ".jpg"
+            cv2.imwrite(output_path, small, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        return output_path
+    
+    def render_highlight_from_mask(self, img1_path, diff_mask: DiffMask, output_path):
+        """
+        Pełnowymiarowy obraz z podświetleniem na podstawie maski z wyniku (na żądanie)
+        """
+        img1 = cv2.imread(img1_path)
+        if img1 is None:
+            raise ValueError("Nie można wczytać obrazu")
+        
+        mask = diff_mask.to_array()
+        if img1.shape[:2] != mask.shape:
+            img1 = cv2.resize(img1, (mask.shape[1], mask.shape[0]))
+        
+        img1[mask] = [0, 0, 255]  # Czerwone podświetlenie
+        cv2.imwrite(output_path, img1)
+        return output_path
+    
     def create_highlighted_diff(self, img1_path, img2_path, output_path):
         """
         Tworzy obraz z podświetlonymi różnicami